@@ -1 +1,2 @@
 from .src.graphcache import GraphCache
+from .utils.change_feed import ChangeFeedConsumer
@@ -0,0 +1,88 @@
+"""
+Bulk load vertices (JSON lines) and edges (CSV) into graphcache
+
+usage:
+python -m graphcache.load --vertices vertices.jsonl --edges edges.csv --optimise-for bananas
+python -m graphcache.load --graphcache-ref graphcache-MZ5SQR --edges edges.csv --workers 8
+"""
+
+import argparse
+import sys
+
+from .src.graphcache import GraphCache
+from .src.loader import load
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m graphcache.load",
+        description="Bulk load vertices (JSON lines) and edges (CSV) into graphcache",
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=0)
+    parser.add_argument(
+        "--graphcache-ref", help="load into existing graphcache, default creates one"
+    )
+    parser.add_argument(
+        "--optimise-for",
+        action="append",
+        default=[],
+        metavar="KEY",
+        help="optimisation key for new graphcache (repeatable)",
+    )
+    parser.add_argument("--vertices", help="JSON lines file, one vertex per line")
+    parser.add_argument("--edges", help="CSV file, one 'source,target' edge per row")
+    parser.add_argument("--id-field", default="id", help="vertex id field")
+    parser.add_argument("--delimiter", default=",", help="CSV delimiter")
+    parser.add_argument("--skip-header", action="store_true", help="skip first CSV row")
+    parser.add_argument("--workers", type=int, help="processes, default CPU count")
+    parser.add_argument("--shards", type=int, help="shards, default from input size")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--tmp-dir", help="directory for shard files")
+    parser.add_argument("--compression", choices=["zlib", "lz4", "zstd"])
+    args = parser.parse_args(argv)
+
+    if not args.vertices and not args.edges:
+        parser.error("--vertices or --edges is required")
+
+    graphcache = GraphCache(
+        host=args.host,
+        port=args.port,
+        db=args.db,
+        graphcache_ref=args.graphcache_ref,
+        compression=args.compression,
+    )
+    if args.graphcache_ref is None:
+        for key in args.optimise_for:
+            graphcache.optimise_for(key)
+
+    def progress(stats):
+        sys.stderr.write(
+            "%(phase)s: %(shards_done)d/%(shards)d shards, %(vertices)d vertices, "
+            "%(edges)d edges, %(seconds).1fs, %(rate).0f records/s\n" % stats
+        )
+
+    totals = load(
+        graphcache,
+        vertices_path=args.vertices,
+        edges_path=args.edges,
+        workers=args.workers,
+        shards=args.shards,
+        chunk_size=args.chunk_size,
+        id_field=args.id_field,
+        delimiter=args.delimiter,
+        skip_header=args.skip_header,
+        tmp_dir=args.tmp_dir,
+        progress=progress,
+    )
+
+    sys.stderr.write(
+        "loaded %(vertices)d vertices and %(edges)d edges "
+        "(%(skipped_edges)d edges skipped) in %(seconds).1fs\n" % totals
+    )
+    print(graphcache.cache_key)
+
+
+if __name__ == "__main__":
+    main()
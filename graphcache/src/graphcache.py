@@ -1,5 +1,18 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from .node import Node
+from .node_ref_group import get_matcher, log_slow_query
 from ..utils.cache import Cache
+from ..utils.query_cache import QueryCache
+from ..utils.change_feed import ChangeFeed, get_stream_key
+from ..utils.local_cache import LocalCache
+
+# nodes fetched per round trip in warm up
+WARM_UP_CHUNK = 1000
+
+# nodes fetched per round trip in path search
+PATH_FETCH_CHUNK = 1000
 
 
 class GraphCache:
@@ -23,7 +36,24 @@ class GraphCache:
     # Also used for 'graphcache_node_id' optimisation key for each node
     count_nodes = 0
 
-    def __init__(self, host="localhost", port=6379, db=0, graphcache_ref=None):
+    def __init__(
+        self,
+        host="localhost",
+        port=6379,
+        db=0,
+        graphcache_ref=None,
+        compression=None,
+        compression_threshold=1024,
+        query_cache_size=0,
+        change_feed=False,
+        change_feed_maxlen=None,
+        local_cache_size=0,
+        local_cache_ttl=60,
+        track_access=False,
+        access_flush_seconds=10,
+        warm_up=None,
+        slow_query_threshold=None,
+    ):
         """
         Init method (constructor)
 
@@ -31,11 +61,44 @@ class GraphCache:
         ----------
         graphcache_ref: string
             reference to graphcache object to load saved graphcache object, if any (optional)
-        cache_sync: bool
-            sync to cache, default true
+        compression: string
+            compress stored nodes with "zlib", "lz4" or "zstd" (optional)
+        compression_threshold: int
+            nodes smaller than this (in bytes) are stored uncompressed
+        query_cache_size: int
+            number of filter/sort results to memoise, 0 disables memoisation (default)
+        change_feed: bool
+            append mutation events to Redis Stream '<cache_key>:changes', default false
+            (read them with ChangeFeedConsumer)
+        change_feed_maxlen: int
+            approximate maximum number of events kept in stream (optional)
+        local_cache_size: int
+            bytes of stored nodes to keep client side, 0 disables local cache (default)
+        local_cache_ttl: int
+            seconds a node is read from local cache before it is read again from redis,
+            None keeps it till evicted or changed by this client
+        track_access: bool
+            count node reads in sorted set '<cache_key>:access' (used by warm_up), default false
+        access_flush_seconds: float
+            counted reads are sent to sorted set on first read after these many seconds
+            (or after 1000 reads)
+        warm_up: dict
+            arguments for warm_up, run once graphcache is loaded (optional)
+            example: {"depth": 2, "background": True}
+        slow_query_threshold: float
+            seconds after which a filter/sort query is logged as slow
+            (optional, see set_slow_query_log)
         """
 
-        self.cache = Cache(host=host, port=port, db=db)
+        self.cache = Cache(
+            host=host,
+            port=port,
+            db=db,
+            compression=compression,
+            compression_threshold=compression_threshold,
+        )
+        if query_cache_size:
+            self.cache.query_cache = QueryCache(query_cache_size)
 
         # Create new graphcache
         if graphcache_ref is None:
@@ -60,9 +123,25 @@ class GraphCache:
             self.entry_node_ref = graphcache.entry_node_ref
             self.cache_key = graphcache.cache_key
 
+        if change_feed:
+            self.cache.change_feed = ChangeFeed(
+                get_stream_key(self.cache_key), change_feed_maxlen
+            )
+        if local_cache_size:
+            self.cache.local_cache = LocalCache(local_cache_size, local_cache_ttl)
+        if track_access:
+            self.cache.access_counter = self.cache_key + ":access"
+            self.cache.access_flush_seconds = access_flush_seconds
+        if slow_query_threshold is not None:
+            self.set_slow_query_log(slow_query_threshold)
+
         self.entry = self.cache.get(self.entry_node_ref)
 
-    def get_node(self, node_ref):
+        self.warm_up_thread = None
+        if warm_up is not None:
+            self.warm_up(**warm_up)
+
+    def get_node(self, node_ref, use_local=True):
         """
         Get node object from cache, if exists
 
@@ -70,6 +149,9 @@ class GraphCache:
         ----------
         node_ref: string
             reference to node object
+        use_local: bool
+            read from local cache, if enabled, default true
+            (pass false for nodes to be modified, local copies can be stale)
 
         Returns
         -------
@@ -77,7 +159,7 @@ class GraphCache:
             Node class type object
         """
 
-        return self.cache.get(node_ref)
+        return self.cache.get(node_ref, use_local=use_local)
 
     def add_vertex(self, data):
         """
@@ -100,6 +182,7 @@ class GraphCache:
             node = Node(
                 self.cache, GraphCache.count_nodes, data, self.optimisation_keys
             )
+            self.cache.publish("add_vertex", node=node.cache_key)
 
             return node
 
@@ -107,7 +190,7 @@ class GraphCache:
             # _validate_node_data will return True or raise exception
             pass
 
-    def add_edge(self, vertex1, vertex2):
+    def add_edge(self, vertex1, vertex2, cache_sync=True):
         """
         Add edge from vertex1 to vertex2
         Outgoing path is added for vertex1 and Incoming path is added to vertex2
@@ -118,10 +201,141 @@ class GraphCache:
             Node object
         vertex2: Node
             Node object
+        cache_sync: bool
+            sync to cache, default true
+        """
+
+        vertex1.add_outgoing_node(vertex2, cache_sync)
+        vertex2.add_incoming_node(vertex1, cache_sync)
+        if cache_sync:
+            self.cache.publish(
+                "add_edge", node=vertex1.cache_key, other=vertex2.cache_key
+            )
+
+    def remove_vertex(self, vertex, transaction=False):
+        """
+        Remove vertex from graphcache, along with all its edges
+        (see remove_vertices)
+
+        Parameters
+        ----------
+        vertex: Node object or string
+            node or its reference
+        transaction: bool
+            write as a MULTI/EXEC transaction, default false
+
+        Returns
+        -------
+        int
+            number of node references removed from adjacent nodes
+        """
+
+        return self.remove_vertices([vertex], transaction)
+
+    def remove_vertices(self, vertices, transaction=False):
+        """
+        Remove vertices from graphcache, along with all their edges
+        Nodes are fetched in one round trip, then their adjacent nodes in one round trip,
+        each adjacent node is updated once and all writes/removals are sent in one pipelined round
+
+        Parameters
+        ----------
+        vertices: iterable
+            Node objects or their references
+        transaction: bool
+            write as a MULTI/EXEC transaction, default false
+
+        Returns
+        -------
+        int
+            number of node references removed from adjacent nodes
+        """
+
+        node_refs = set(
+            vertex if isinstance(vertex, str) else vertex.cache_key
+            for vertex in vertices
+        )
+        if self.entry_node_ref in node_refs:
+            raise ValueError("GraphCache Error: entry node can not be removed")
+
+        # adjacent node reference -> references to remove from its (incoming, outgoing) nodes
+        to_update = {}
+        for node in self.cache.get_many(node_refs, use_local=False):
+            if node is None:
+                continue
+            for node_ref in node.get_outgoing().get_all_node_refs():
+                if node_ref not in node_refs:
+                    to_update.setdefault(node_ref, (set(), set()))[0].add(
+                        node.cache_key
+                    )
+            for node_ref in node.get_incoming().get_all_node_refs():
+                if node_ref not in node_refs:
+                    to_update.setdefault(node_ref, (set(), set()))[1].add(
+                        node.cache_key
+                    )
+
+        removed = 0
+        adjacent_refs = list(to_update.keys())
+        with self.cache.batch(transaction):
+            for node_ref, node in zip(
+                adjacent_refs, self.cache.get_many(adjacent_refs, use_local=False)
+            ):
+                if node is None:
+                    continue
+                incoming_refs, outgoing_refs = to_update[node_ref]
+                count = node.get_incoming().remove_node_refs(incoming_refs)
+                count += node.get_outgoing().remove_node_refs(outgoing_refs)
+
+                # nodes about to expire are left to expire
+                ttl = node.get_ttl()
+                if count and ttl != 0:
+                    self.cache.set(node_ref, node, ttl)
+                removed += count
+
+            for node_ref in node_refs:
+                self.cache.remove(node_ref)
+                self.cache.publish("remove_vertex", node=node_ref)
+
+        return removed
+
+    def batch(self, transaction=False):
+        """
+        Open a batch session, to be used as context manager
+        Nodes written inside the session are written once on exit, in one pipelined round
+
+        example:
+        with g.batch():
+            for node in nodes:
+                g.add_edge(hub, node)
+
+        Parameters
+        ----------
+        transaction: bool
+            flush as a MULTI/EXEC transaction, default false
+
+        Returns
+        -------
+        context manager
+        """
+
+        return self.cache.batch(transaction)
+
+    def set_slow_query_log(self, threshold, hook=None):
+        """
+        Report filter/sort queries (from start of chain till its result is read) taking
+        at least threshold seconds
+
+        Parameters
+        ----------
+        threshold: float
+            seconds, None disables slow query log
+        hook: function
+            called with dict of node, direction, ops and time of slow query,
+            default logs a warning with 'graphcache' logger
         """
 
-        vertex1.add_outgoing_node(vertex2)
-        vertex2.add_incoming_node(vertex1)
+        self.cache.slow_query_threshold = threshold
+        self.cache.slow_query_hook = hook or log_slow_query
 
     def optimise_for(self, key):
         """
@@ -140,6 +354,546 @@ class GraphCache:
         if key not in self.entry.data:
             self.entry.update_data(key, 0)
 
+        # optimisation keys are read from cache when graphcache is loaded
+        self.cache.set(self.cache_key, self)
+
+    def shortest_path(
+        self, node1, node2, max_depth=None, max_visited=100000, node_filter=None
+    ):
+        """
+        Get shortest path from node1 to node2 following outgoing paths
+        Bidirectional breadth first search, expanding outgoing paths from node1 and
+        incoming paths from node2 (smaller frontier first), each frontier fetched in chunks of
+        one round trip each
+
+        Parameters
+        ----------
+        node1: Node object or string
+            start node or its reference
+        node2: Node object or string
+            end node or its reference
+        max_depth: int
+            maximum number of edges in path (optional)
+        max_visited: int
+            maximum number of nodes to visit before giving up
+        node_filter: function
+            predicate on Node object, nodes for which it returns False are not
+            used as intermediate nodes (optional)
+
+        Returns
+        -------
+        list or None
+            list of Node objects from node1 to node2 (both included),
+            None if no path is found within max_depth and max_visited
+        """
+
+        start_ref = node1 if isinstance(node1, str) else node1.cache_key
+        end_ref = node2 if isinstance(node2, str) else node2.cache_key
+
+        if start_ref == end_ref:
+            start = self.cache.get(start_ref, True)
+            return [start] if start is not None else None
+
+        start, end = self.cache.get_many([start_ref, end_ref])
+        if start is None or end is None:
+            return None
+
+        # node reference -> (parent reference, depth), for both searches
+        forward = {start_ref: (None, 0)}
+        backward = {end_ref: (None, 0)}
+        forward_frontier = [start]
+        backward_frontier = [end]
+        forward_depth = backward_depth = 0
+        # expired nodes and nodes rejected by node_filter
+        rejected = set()
+
+        while forward_frontier and backward_frontier:
+            if max_depth is not None and forward_depth + backward_depth >= max_depth:
+                return None
+
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_depth += 1
+                forward_frontier, meeting_ref = self.__expand_frontier(
+                    forward_frontier,
+                    forward,
+                    backward,
+                    rejected,
+                    "outgoing",
+                    node_filter,
+                    max_visited,
+                )
+            else:
+                backward_depth += 1
+                backward_frontier, meeting_ref = self.__expand_frontier(
+                    backward_frontier,
+                    backward,
+                    forward,
+                    rejected,
+                    "incoming",
+                    node_filter,
+                    max_visited,
+                )
+
+            if meeting_ref is not None:
+                path = []
+                node_ref = meeting_ref
+                while node_ref is not None:
+                    path.append(node_ref)
+                    node_ref = forward[node_ref][0]
+                path.reverse()
+                node_ref = backward[meeting_ref][0]
+                while node_ref is not None:
+                    path.append(node_ref)
+                    node_ref = backward[node_ref][0]
+
+                return list(filter(None, self.cache.get_many(path)))
+
+        # frontier is None if max_visited was reached
+        return None
+
+    def reachable(
+        self, node1, node2, max_depth=None, max_visited=100000, node_filter=None
+    ):
+        """
+        Check if node2 can be reached from node1 following outgoing paths
+        (see shortest_path)
+
+        Parameters
+        ----------
+        node1: Node object or string
+            start node or its reference
+        node2: Node object or string
+            end node or its reference
+        max_depth: int
+            maximum number of edges in path (optional)
+        max_visited: int
+            maximum number of nodes to visit before giving up
+        node_filter: function
+            predicate on Node object, nodes for which it returns False are not
+            used as intermediate nodes (optional)
+
+        Returns
+        -------
+        bool
+        """
+
+        return (
+            self.shortest_path(node1, node2, max_depth, max_visited, node_filter)
+            is not None
+        )
+
+    def __expand_frontier(
+        self,
+        frontier,
+        visited,
+        other_visited,
+        rejected,
+        direction,
+        node_filter,
+        max_visited,
+    ):
+        """
+        Expand one level of breadth first search
+        (private method)
+
+        Parameters
+        ----------
+        frontier: list
+            list of Node objects of current level
+        visited: dict
+            node reference -> (parent reference, depth) of this search, updated in place
+        other_visited: dict
+            node reference -> (parent reference, depth) of opposite search
+        rejected: set
+            references of expired or filtered out nodes, updated in place
+        direction: string
+            "outgoing" or "incoming", paths to follow
+        node_filter: function
+            predicate on Node object (optional)
+        max_visited: int
+            maximum number of nodes visited by both searches
+
+        Returns
+        -------
+        tuple
+            (list of Node objects of next level or None if max_visited was reached,
+            reference of node where both searches meet on the shortest path or None)
+        """
+
+        new_refs = []
+        meeting_ref = None
+        meeting_depth = None
+        exhausted = False
+
+        for node in frontier:
+            if direction == "outgoing":
+                node_refs = node.get_outgoing().get_all_node_refs()
+            else:
+                node_refs = node.get_incoming().get_all_node_refs()
+
+            for node_ref in node_refs:
+                if node_ref in visited or node_ref in rejected:
+                    continue
+
+                if node_ref in other_visited:
+                    # nodes in other search are already fetched and filtered
+                    visited[node_ref] = (node.cache_key, visited[node.cache_key][1] + 1)
+                    if (
+                        meeting_depth is None
+                        or other_visited[node_ref][1] < meeting_depth
+                    ):
+                        meeting_ref = node_ref
+                        meeting_depth = other_visited[node_ref][1]
+                elif len(visited) + len(other_visited) >= max_visited:
+                    # refs are still scanned for a meeting node, nothing more is fetched
+                    exhausted = True
+                else:
+                    visited[node_ref] = (node.cache_key, visited[node.cache_key][1] + 1)
+                    new_refs.append(node_ref)
+
+        if meeting_ref is not None:
+            return [], meeting_ref
+        if exhausted:
+            return None, None
+
+        next_frontier = []
+        fetched = self.__fetch_many(new_refs, None, PATH_FETCH_CHUNK)
+        for node_ref in new_refs:
+            node = fetched[node_ref]
+            if node is not None and (node_filter is None or node_filter(node)):
+                next_frontier.append(node)
+            else:
+                del visited[node_ref]
+                rejected.add(node_ref)
+
+        return next_frontier, None
+
+    def neighbors_many(
+        self,
+        nodes,
+        direction="outgoing",
+        filters=None,
+        sort=None,
+        limit=None,
+        workers=None,
+        chunk_size=1000,
+    ):
+        """
+        Get filtered and sorted neighbours of many nodes at once
+        Filters and sort on stored values (see NodeRefGroup.get_index_keys) run on each
+        node's references, then distinct neighbours of all nodes are fetched once, in chunks
+        of one round trip each, other filters run once per distinct neighbour and sort on
+        other keys runs on fetched values (no sort index is built, see NodeRefGroup.sort_by)
+
+        example:
+        g.neighbors_many(seeds, filters=[("apples", 5, "lt")], sort="bananas", limit=10)
+
+        Parameters
+        ----------
+        nodes: list
+            Node objects or references
+        direction: string
+            "outgoing" or "incoming", neighbours to get
+        filters: list
+            list of (key, input1, operator) tuples, as arguments of NodeRefGroup.filter_by
+            (operator is optional), neighbours without the key are left out (optional)
+        sort: string or list
+            key to sort by, or list of (key, order) tuples, as NodeRefGroup.sort_by,
+            neighbours without the key are placed at the end (optional)
+        limit: int
+            maximum number of neighbours per node, without filters or sort on fetched nodes
+            only these many are fetched (and more in place of expired ones) (optional)
+        workers: int
+            number of threads fetching chunks concurrently (optional)
+        chunk_size: int
+            number of neighbours fetched per round trip
+
+        Returns
+        -------
+        list
+            list of lists of Node objects, for each of given nodes in order
+            (neighbours shared by nodes are the same objects, expired nodes get empty lists)
+        """
+
+        if direction not in ("outgoing", "incoming"):
+            raise ValueError(
+                "GraphCache Error: direction must be 'outgoing' or 'incoming', "
+                + str(direction)
+                + " given"
+            )
+
+        filters = [tuple(node_filter) for node_filter in filters or []]
+        # validates filters before any query is run
+        predicates = [(x[0], get_matcher(*x[1:])) for x in filters]
+
+        if sort is None:
+            sort_spec = []
+        elif isinstance(sort, str):
+            sort_spec = [(sort, "asc")]
+        else:
+            sort_spec = [
+                (item, "asc") if isinstance(item, str) else tuple(item) for item in sort
+            ]
+        for _, sort_order in sort_spec:
+            if sort_order not in ("asc", "desc"):
+                raise Exception(
+                    "Error: order does not match, " + str(sort_order) + " given"
+                )
+
+        seeds = list(nodes)
+        seed_refs = [node for node in seeds if isinstance(node, str)]
+        fetched = dict(zip(seed_refs, self.cache.get_many(seed_refs)))
+        seeds = [fetched[node] if isinstance(node, str) else node for node in seeds]
+
+        results = []
+        # number of leading references of each node's list to fetch
+        fetch_counts = []
+        # for each node, if its neighbours are sorted after fetching
+        fetched_sorts = []
+        scanned = False
+        for seed in seeds:
+            if seed is None:
+                results.append([])
+                fetch_counts.append(0)
+                fetched_sorts.append(False)
+                continue
+
+            if direction == "outgoing":
+                group = seed.get_outgoing()
+            else:
+                group = seed.get_incoming()
+            index_keys = group.get_index_keys()
+
+            scan = False
+            for node_filter in filters:
+                if node_filter[0] in index_keys:
+                    group.filter_by(*node_filter)
+                else:
+                    scan = True
+            fetched_sort = any(key not in index_keys for key, _ in sort_spec)
+            if sort_spec and not fetched_sort:
+                group.sort_by(sort_spec)
+            node_refs = group.get_all_node_refs()
+            results.append(node_refs)
+            fetched_sorts.append(fetched_sort)
+            scanned = scanned or scan
+
+            # without filters or sort on fetched nodes, only neighbours within limit are fetched
+            if limit is not None and not scan and not fetched_sort:
+                fetch_counts.append(limit)
+            else:
+                fetch_counts.append(len(node_refs))
+
+        fetched = {}
+        while True:
+            distinct_refs = list(
+                dict.fromkeys(
+                    node_ref
+                    for node_refs, fetch_count in zip(results, fetch_counts)
+                    for node_ref in node_refs[:fetch_count]
+                    if node_ref not in fetched
+                )
+            )
+            if not distinct_refs:
+                break
+            fetched.update(self.__fetch_many(distinct_refs, workers, chunk_size))
+
+            # expired neighbours are replaced by next references, till limit is reached
+            for index, node_refs in enumerate(results):
+                fetch_count = fetch_counts[index]
+                alive = sum(
+                    1
+                    for node_ref in node_refs[:fetch_count]
+                    if fetched[node_ref] is not None
+                )
+                if limit is not None and alive < limit:
+                    fetch_counts[index] = fetch_count + limit - alive
+
+        # all filters run once per distinct neighbour (stored values were applied already)
+        selected = set(
+            node_ref
+            for node_ref, node in fetched.items()
+            if node is not None
+            and (
+                not scanned
+                or all(
+                    key in node.data and matches(node.data[key])
+                    for key, matches in predicates
+                )
+            )
+        )
+
+        neighbours = []
+        for node_refs, fetch_count, fetched_sort in zip(
+            results, fetch_counts, fetched_sorts
+        ):
+            nodes = [
+                fetched[node_ref]
+                for node_ref in node_refs[:fetch_count]
+                if node_ref in selected
+            ]
+            if fetched_sort:
+                # stable sort on each key, least significant first
+                for key, sort_order in reversed(sort_spec):
+                    present = [node for node in nodes if key in node.data]
+                    present.sort(
+                        key=lambda node: node.data[key],
+                        reverse=(sort_order == "desc"),
+                    )
+                    nodes = present + [node for node in nodes if key not in node.data]
+            neighbours.append(nodes[:limit])
+
+        return neighbours
+
+    def __fetch_many(self, node_refs, workers, chunk_size):
+        """
+        Fetch nodes in chunks of one round trip each, concurrently if workers are given
+        (private method)
+
+        Returns
+        -------
+        dict
+            node reference -> Node object, None for expired nodes
+        """
+
+        chunks = [
+            node_refs[i : i + chunk_size] for i in range(0, len(node_refs), chunk_size)
+        ]
+        if workers and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fetched_chunks = list(pool.map(self.cache.get_many, chunks))
+        else:
+            fetched_chunks = [self.cache.get_many(chunk) for chunk in chunks]
+
+        fetched = {}
+        for chunk, nodes in zip(chunks, fetched_chunks):
+            fetched.update(zip(chunk, nodes))
+
+        return fetched
+
+    def warm_up(
+        self,
+        nodes=None,
+        depth=1,
+        most_accessed=0,
+        direction="both",
+        time_budget=None,
+        memory_budget=None,
+        background=False,
+    ):
+        """
+        Prefetch neighbourhood of nodes into local cache, one round trip per level
+        Starts from given nodes (entry node if none are given) and the most accessed nodes
+
+        Parameters
+        ----------
+        nodes: list
+            Node objects or references to start from (optional)
+        depth: int
+            number of levels (hops) to prefetch around start nodes
+        most_accessed: int
+            also start from these many most accessed nodes (needs track_access)
+        direction: string
+            "outgoing", "incoming" or "both", paths to follow
+        time_budget: float
+            seconds after which prefetch stops (optional)
+        memory_budget: int
+            bytes of local cache after which prefetch stops (optional)
+        background: bool
+            prefetch in a daemon thread, default false
+
+        Returns
+        -------
+        int or Thread
+            number of nodes prefetched, or the started thread if background
+            (also kept in self.warm_up_thread)
+        """
+
+        if self.cache.local_cache is None:
+            raise ValueError("GraphCache Error: warm up needs local cache")
+
+        if nodes is None:
+            node_refs = [] if most_accessed else [self.entry_node_ref]
+        else:
+            node_refs = [
+                node if isinstance(node, str) else node.cache_key for node in nodes
+            ]
+
+        if most_accessed:
+            self.cache.flush_access_counts()
+            node_refs += [
+                node_ref.decode()
+                for node_ref in self.cache.cache.zrevrange(
+                    self.cache_key + ":access", 0, most_accessed - 1
+                )
+            ]
+
+        if background:
+            self.warm_up_thread = threading.Thread(
+                target=self.__warm_up,
+                args=(node_refs, depth, direction, time_budget, memory_budget),
+                daemon=True,
+            )
+            self.warm_up_thread.start()
+
+            return self.warm_up_thread
+
+        return self.__warm_up(node_refs, depth, direction, time_budget, memory_budget)
+
+    def __warm_up(self, node_refs, depth, direction, time_budget, memory_budget):
+        """
+        Prefetch levels of neighbourhood into local cache, within budgets
+        (private method)
+
+        Returns
+        -------
+        int
+            number of nodes prefetched
+        """
+
+        started = time.time()
+        local_cache = self.cache.local_cache
+        visited = set()
+        prefetched = 0
+        level = list(dict.fromkeys(node_refs))
+
+        for _ in range(depth + 1):
+            level = [node_ref for node_ref in level if node_ref not in visited]
+            visited.update(level)
+
+            next_level = []
+            for i in range(0, len(level), WARM_UP_CHUNK):
+                chunk = level[i : i + WARM_UP_CHUNK]
+                for node in self.cache.get_many(chunk, count_access=False):
+                    if node is None:
+                        continue
+                    prefetched += 1
+                    if direction in ("outgoing", "both"):
+                        next_level.extend(node.get_outgoing().get_all_node_refs())
+                    if direction in ("incoming", "both"):
+                        next_level.extend(node.get_incoming().get_all_node_refs())
+
+                if time_budget is not None and time.time() - started >= time_budget:
+                    return prefetched
+                if memory_budget is not None and local_cache.size >= memory_budget:
+                    return prefetched
+
+            level = next_level
+
+        return prefetched
+
+    def __getstate__(self):
+        """
+        Required for pickling, only references and optimisation keys are stored
+        (entry node and warm up thread are loaded/created again)
+        """
+
+        return {
+            "optimisation_keys": self.optimisation_keys,
+            "entry_node_ref": self.entry_node_ref,
+            "cache_key": self.cache_key,
+        }
+
     def __validate_node_data(self, data):
         """
         Validates if all optimisation keys (specified for graphcache) exist in data
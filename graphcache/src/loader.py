@@ -0,0 +1,476 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from multiprocessing import Pool
+
+from .graphcache import GraphCache
+from .node import Node
+from ..utils.cache import Cache
+
+# input is split in shards of about this size, which bounds memory of each worker
+SHARD_BYTES = 64 * 1024 * 1024
+
+
+def get_index_key(graphcache_ref):
+    """
+    Get key of hash mapping external vertex ids of loaded vertices to node references
+
+    Parameters
+    ----------
+    graphcache_ref: string
+        reference to graphcache object
+
+    Returns
+    -------
+    string
+    """
+
+    return graphcache_ref + ":load:index"
+
+
+def get_loaded_node_ref(graphcache, vertex_id):
+    """
+    Get reference of a node loaded by load(), by its external vertex id
+
+    Parameters
+    ----------
+    graphcache: GraphCache object
+    vertex_id: string
+        id of vertex in vertices file
+
+    Returns
+    -------
+    string or None
+        reference to node, None if vertex was not loaded
+    """
+
+    entry = graphcache.cache.cache.hget(
+        get_index_key(graphcache.cache_key), str(vertex_id)
+    )
+    if entry is None:
+        return None
+
+    return json.loads(entry)[0]
+
+
+def load(
+    graphcache,
+    vertices_path=None,
+    edges_path=None,
+    workers=None,
+    shards=None,
+    chunk_size=1000,
+    id_field="id",
+    delimiter=",",
+    skip_header=False,
+    tmp_dir=None,
+    progress=None,
+):
+    """
+    Bulk load vertices and edges into graphcache
+
+    Input is streamed once and split into shard files by vertex id (in tmp_dir),
+    then a pool of processes registers the vertices of each shard and builds their nodes,
+    with adjacency already sorted by every optimisation key, writing them through pipelines.
+    Shard files larger than SHARD_BYTES are split again, so memory of each worker is bounded
+    by shard size, not by input size (unless records of a single vertex exceed it).
+    Edges of vertices loaded before (by an earlier load into same graphcache) are merged
+    into their existing nodes, so edges can be loaded without vertices.
+    External vertex ids are mapped to node references in hash '<cache_key>:load:index'
+    (see get_loaded_node_ref).
+
+    Parameters
+    ----------
+    graphcache: GraphCache object
+        graphcache to load into, its optimisation keys must be set already
+    vertices_path: string
+        JSON lines file, one vertex data dict per line with vertex id in id_field
+    edges_path: string
+        CSV file, one edge per row as: source vertex id, target vertex id (other columns are ignored)
+    workers: int
+        number of processes, default number of CPUs (1 loads in current process)
+    shards: int
+        number of shards, default from input size
+    chunk_size: int
+        number of nodes per pipelined write
+    id_field: string
+        vertex id field in vertex data
+    delimiter: string
+        CSV delimiter of edges file
+    skip_header: bool
+        skip first row of edges file
+    tmp_dir: string
+        directory for shard files (optional)
+    progress: function
+        called with dict of phase, shards_done, shards, vertices, edges, skipped_edges,
+        seconds and rate (records per second) after every shard (optional)
+
+    Returns
+    -------
+    dict
+        number of vertices, edges, skipped_edges (edges with unknown vertices) and seconds
+    """
+
+    started = time.time()
+    workers = workers or os.cpu_count() or 1
+    if shards is None:
+        input_bytes = sum(
+            os.path.getsize(path) for path in (vertices_path, edges_path) if path
+        )
+        # initial estimate, shards are split again by the bytes written to them
+        shards = max(workers * 4, input_bytes // SHARD_BYTES + 1)
+
+    cache = graphcache.cache
+    config = {
+        "cache": {
+            "host": cache.host,
+            "port": cache.port,
+            "db": cache.db,
+            "compression": cache.compression,
+            "compression_threshold": cache.compression_threshold,
+            "compression_level": cache.compression_level,
+        },
+        "graphcache_ref": graphcache.cache_key,
+        "optimisation_keys": list(graphcache.optimisation_keys),
+        "chunk_size": chunk_size,
+    }
+
+    # node ids continue from graphcache's count_nodes, across processes and loads
+    id_counter_key = graphcache.cache_key + ":load:node_id"
+    cache.cache.set(id_counter_key, GraphCache.count_nodes, nx=True)
+
+    shard_dir = tempfile.mkdtemp(prefix="graphcache-load-", dir=tmp_dir)
+    try:
+        totals = {"vertices": 0, "edges": 0, "skipped_edges": 0}
+        shard_paths = _partition(
+            shard_dir,
+            shards,
+            vertices_path,
+            edges_path,
+            id_field,
+            delimiter,
+            skip_header,
+        )
+        shard_paths = _split_shards(shard_paths, shards)
+
+        args = [(config, shard_path) for shard_path in shard_paths]
+        for phase, function in (("index", _index_shard), ("build", _build_shard)):
+            if workers == 1:
+                results = map(function, args)
+            else:
+                pool = Pool(workers)
+                results = pool.imap_unordered(function, args)
+
+            try:
+                for shards_done, result in enumerate(results, 1):
+                    if phase == "build":
+                        for key in totals:
+                            totals[key] += result[key]
+                    if progress is not None:
+                        seconds = time.time() - started
+                        records = totals["vertices"] + totals["edges"]
+                        progress(
+                            dict(
+                                totals,
+                                phase=phase,
+                                shards_done=shards_done,
+                                shards=len(shard_paths),
+                                seconds=seconds,
+                                rate=records / seconds if seconds else 0.0,
+                            )
+                        )
+            finally:
+                if workers != 1:
+                    pool.close()
+                    pool.join()
+
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    GraphCache.count_nodes = max(
+        GraphCache.count_nodes, int(cache.cache.get(id_counter_key))
+    )
+    totals["seconds"] = time.time() - started
+
+    return totals
+
+
+def _get_shard(vertex_id, shards):
+    """
+    Get shard number of vertex id (stable across processes)
+
+    Parameters
+    ----------
+    vertex_id: string
+    shards: int
+
+    Returns
+    -------
+    int
+    """
+
+    return zlib.crc32(vertex_id.encode()) % shards
+
+
+def _partition(
+    shard_dir, shards, vertices_path, edges_path, id_field, delimiter, skip_header
+):
+    """
+    Stream input files into shard files of JSON lines records
+    ["V", vertex id, data], ["O", vertex id, target id] and ["I", vertex id, source id]
+
+    Returns
+    -------
+    list
+        paths of non empty shard files
+    """
+
+    paths = [os.path.join(shard_dir, "shard-%d.jsonl" % i) for i in range(shards)]
+    files = [open(path, "w") for path in paths]
+    try:
+        if vertices_path:
+            with open(vertices_path) as vertices_file:
+                for line in vertices_file:
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    vertex_id = str(data[id_field])
+                    files[_get_shard(vertex_id, shards)].write(
+                        json.dumps(["V", vertex_id, data]) + "\n"
+                    )
+
+        if edges_path:
+            with open(edges_path, newline="") as edges_file:
+                rows = csv.reader(edges_file, delimiter=delimiter)
+                if skip_header:
+                    next(rows, None)
+                for row in rows:
+                    if len(row) < 2:
+                        continue
+                    source, target = row[0], row[1]
+                    files[_get_shard(source, shards)].write(
+                        json.dumps(["O", source, target]) + "\n"
+                    )
+                    files[_get_shard(target, shards)].write(
+                        json.dumps(["I", target, source]) + "\n"
+                    )
+
+    finally:
+        for shard_file in files:
+            shard_file.close()
+
+    return [path for path in paths if os.path.getsize(path)]
+
+
+def _split_shards(shard_paths, shards):
+    """
+    Split shard files larger than SHARD_BYTES into parts of about SHARD_BYTES,
+    keeping all records of a vertex in the same part
+
+    Parameters
+    ----------
+    shard_paths: list
+        paths of shard files
+    shards: int
+        number of shards the files were partitioned into
+
+    Returns
+    -------
+    list
+        paths of shard files after split
+    """
+
+    split_paths = []
+    for path in shard_paths:
+        parts = -(-os.path.getsize(path) // SHARD_BYTES)
+        if parts <= 1:
+            split_paths.append(path)
+            continue
+
+        part_paths = ["%s.%d" % (path, i) for i in range(parts)]
+        files = [open(part_path, "w") for part_path in part_paths]
+        try:
+            with open(path) as shard_file:
+                for line in shard_file:
+                    vertex_id = json.loads(line)[1]
+                    # bits of the hash not used by _get_shard
+                    part = (zlib.crc32(vertex_id.encode()) // shards) % parts
+                    files[part].write(line)
+        finally:
+            for part_file in files:
+                part_file.close()
+
+        os.remove(path)
+        split_paths.extend(
+            part_path for part_path in part_paths if os.path.getsize(part_path)
+        )
+
+    return split_paths
+
+
+def _index_shard(args):
+    """
+    Register vertices of a shard: assign node reference and node id, and store them with
+    values of optimisation keys in index hash
+    (runs in worker process)
+    """
+
+    config, shard_path = args
+    cache = Cache(**config["cache"])
+    index_key = get_index_key(config["graphcache_ref"])
+    id_counter_key = config["graphcache_ref"] + ":load:node_id"
+    optimisation_keys = config["optimisation_keys"]
+
+    def flush(chunk):
+        last_id = cache.cache.incrby(id_counter_key, len(chunk))
+        pipe = cache.cache.pipeline(transaction=False)
+        for node_id, (vertex_id, data) in enumerate(chunk, last_id - len(chunk) + 1):
+            values = {"graphcache_node_id": node_id}
+            for key in optimisation_keys[1:]:
+                values[key] = data[key]
+            # longer keys than get_random_key's default, collisions are likely at bulk scale
+            node_ref = cache.get_random_key(size=12)
+            pipe.hset(index_key, vertex_id, json.dumps([node_ref, values]))
+        pipe.execute()
+
+    chunk = []
+    with open(shard_path) as shard_file:
+        for line in shard_file:
+            record = json.loads(line)
+            if record[0] != "V":
+                continue
+            missing_keys = [x for x in optimisation_keys[1:] if x not in record[2]]
+            if missing_keys:
+                raise ValueError(
+                    "GraphCache Error: "
+                    + str(missing_keys)
+                    + " optimisation keys missing in data of vertex "
+                    + record[1]
+                )
+            chunk.append((record[1], record[2]))
+            if len(chunk) >= config["chunk_size"]:
+                flush(chunk)
+                chunk = []
+
+    if chunk:
+        flush(chunk)
+
+
+def _build_shard(args):
+    """
+    Build nodes of a shard with adjacency sorted by every optimisation key and write them
+    in pipelined chunks
+    (runs in worker process)
+
+    Returns
+    -------
+    dict
+        number of vertices, edges and skipped_edges of the shard
+    """
+
+    config, shard_path = args
+    cache = Cache(**config["cache"])
+    index_key = get_index_key(config["graphcache_ref"])
+    chunk_size = config["chunk_size"]
+
+    vertices = {}
+    outgoing = {}
+    incoming = {}
+    with open(shard_path) as shard_file:
+        for line in shard_file:
+            kind, vertex_id, value = json.loads(line)
+            if kind == "V":
+                vertices[vertex_id] = value
+            elif kind == "O":
+                outgoing.setdefault(vertex_id, []).append(value)
+            else:
+                incoming.setdefault(vertex_id, []).append(value)
+
+    # vertex id -> [node reference, values of optimisation keys], for self and adjacent vertices
+    vertex_ids = set(vertices) | set(outgoing) | set(incoming)
+    for adjacent_ids in list(outgoing.values()) + list(incoming.values()):
+        vertex_ids.update(adjacent_ids)
+    vertex_ids = list(vertex_ids)
+    resolved = {}
+    for i in range(0, len(vertex_ids), chunk_size):
+        chunk = vertex_ids[i : i + chunk_size]
+        for vertex_id, entry in zip(chunk, cache.cache.hmget(index_key, chunk)):
+            if entry is not None:
+                resolved[vertex_id] = json.loads(entry)
+
+    counts = {"vertices": 0, "edges": 0, "skipped_edges": 0}
+    for vertex_id, adjacent_ids in outgoing.items():
+        if vertex_id not in resolved:
+            counts["skipped_edges"] += len(adjacent_ids)
+        else:
+            counts["skipped_edges"] += sum(
+                1 for adjacent_id in adjacent_ids if adjacent_id not in resolved
+            )
+
+    # vertices of this load are built, vertices of earlier loads get the new edges merged
+    vertex_ids = [x for x in vertices if x in resolved]
+    vertex_ids += [
+        x for x in set(outgoing) | set(incoming) if x in resolved and x not in vertices
+    ]
+    for i in range(0, len(vertex_ids), chunk_size):
+        chunk = vertex_ids[i : i + chunk_size]
+        existing = cache.get_many(
+            [resolved[x][0] for x in chunk if x not in vertices], count_access=False
+        )
+        existing = dict(zip([x for x in chunk if x not in vertices], existing))
+
+        with cache.batch():
+            for vertex_id in chunk:
+                node_ref, values = resolved[vertex_id]
+                outgoing_entries = [
+                    tuple(resolved[adjacent_id])
+                    for adjacent_id in outgoing.get(vertex_id, [])
+                    if adjacent_id in resolved
+                ]
+                incoming_entries = [
+                    tuple(resolved[adjacent_id])
+                    for adjacent_id in incoming.get(vertex_id, [])
+                    if adjacent_id in resolved
+                ]
+
+                if vertex_id in vertices:
+                    node = Node(
+                        cache,
+                        values["graphcache_node_id"],
+                        vertices[vertex_id],
+                        config["optimisation_keys"],
+                        cache_sync=False,
+                    )
+                    node.cache_key = node_ref
+                    node.ttl = None
+                    node.ttl_set_at = datetime.now()
+                    counts["vertices"] += 1
+
+                else:
+                    node = existing[vertex_id]
+                    if node is None or node.get_ttl() == 0:
+                        # removed or expired since it was loaded
+                        counts["skipped_edges"] += len(outgoing_entries)
+                        continue
+                    # edges loaded before are not added twice
+                    outgoing_refs = set(node.get_outgoing().get_all_node_refs())
+                    incoming_refs = set(node.get_incoming().get_all_node_refs())
+                    outgoing_entries = [
+                        x for x in outgoing_entries if x[0] not in outgoing_refs
+                    ]
+                    incoming_entries = [
+                        x for x in incoming_entries if x[0] not in incoming_refs
+                    ]
+
+                node.get_outgoing().add_node_refs(outgoing_entries)
+                node.get_incoming().add_node_refs(incoming_entries)
+                cache.set(node_ref, node, node.get_ttl())
+
+                counts["edges"] += len(outgoing_entries)
+
+    return counts
@@ -49,8 +49,12 @@ class Node:
         else:
             self.data = data
         self.data["graphcache_node_id"] = id
-        self.incoming_node_refs_list = NodeRefGroup(self.cache, optimisation_keys)
-        self.outgoing_node_refs_list = NodeRefGroup(self.cache, optimisation_keys)
+        self.incoming_node_refs_list = NodeRefGroup(
+            self.cache, optimisation_keys, self, "incoming"
+        )
+        self.outgoing_node_refs_list = NodeRefGroup(
+            self.cache, optimisation_keys, self, "outgoing"
+        )
 
         if ttl or cache_sync:
             self.ttl_set_at = datetime.now()
@@ -74,7 +78,9 @@ class Node:
 
         self.data[key] = value
         self.__update_in_cache(cache_sync)  # updates in cache
-        self.__refresh()  # updates order when value changes
+        self.__refresh(key)  # updates order when value changes
+        if cache_sync:
+            self.cache.publish("update_data", node=self.cache_key, key=key)
 
     def get_cache_key(self):
         """
@@ -141,6 +147,10 @@ class Node:
 
         self.get_incoming().remove_node_ref(node)
         self.__update_in_cache(cache_sync)  # updates in cache
+        if cache_sync:
+            self.cache.publish(
+                "remove_incoming_node", node=self.cache_key, other=node.cache_key
+            )
 
     def get_outgoing(self):
         """
@@ -183,8 +193,12 @@ class Node:
 
         self.get_outgoing().remove_node_ref(node)
         self.__update_in_cache(cache_sync)  # updates in cache
+        if cache_sync:
+            self.cache.publish(
+                "remove_outgoing_node", node=self.cache_key, other=node.cache_key
+            )
 
-    def set_ttl(self, ttl):
+    def set_ttl(self, ttl, cache_sync=True):
         """
         Sets ttl for self node
 
@@ -192,11 +206,15 @@ class Node:
         ----------
         ttl: int
             TTL (time to live) after which node will not be accessible
+        cache_sync: bool
+            sync to cache, default true
         """
 
         self.ttl = ttl
         self.ttl_set_at = datetime.now()
-        self.cache.set(self.cache_key, self, self.ttl)
+        if cache_sync:
+            self.cache.set(self.cache_key, self, self.ttl)
+            self.cache.publish("set_ttl", node=self.cache_key, ttl=ttl)
 
     def get_ttl(self):
         """
@@ -234,23 +252,55 @@ class Node:
         if self.cache_key and cache_sync:
             self.cache.set(self.cache_key, self, self.get_ttl())
 
-    def __refresh(self, cache_sync=True):
+    def __refresh(self, key, cache_sync=True):
         """
-        Updates order of self node in all self incoming nodes' outgoing paths, according to the current data value
+        Updates order of self node in all self incoming nodes' outgoing paths and
+        all self outgoing nodes' incoming paths, according to the current data value
+        (also bumps version of those paths, invalidating their memoised query results)
+        Paths are reordered only if key is stored in them (see NodeRefGroup.get_index_keys),
+        all writes go out in one pipelined round
         (private method)
 
         Parameters
         ----------
+        key: string
+            changed data key
         cache_sync: bool
             sync to cache
         """
 
-        nodes = self.get_incoming().get_all_nodes()
-        for node in nodes:
-            node.remove_outgoing_node(self)
-            node.add_outgoing_node(self)  # add at appropriate place
-
-        self.__update_in_cache(cache_sync)  # updates in cache
+        # not a change of edges, so ref groups are updated directly (no change events)
+        # nodes are read past local cache, they are written back
+        incoming_refs = self.get_incoming().get_all_node_refs()
+        outgoing_refs = self.get_outgoing().get_all_node_refs()
+        # a node on both sides is fetched and written once, with both paths updated
+        node_refs = list(dict.fromkeys(incoming_refs + outgoing_refs))
+        nodes = dict(zip(node_refs, self.cache.get_many(node_refs, use_local=False)))
+        groups = [(x, "outgoing") for x in incoming_refs]
+        groups += [(x, "incoming") for x in outgoing_refs]
+
+        with self.cache.batch():
+            for node_ref, direction in groups:
+                node = nodes[node_ref]
+                if node is None:
+                    continue
+                if direction == "outgoing":
+                    group = node.get_outgoing()
+                else:
+                    group = node.get_incoming()
+
+                if key in group.get_index_keys():
+                    # add at appropriate place
+                    group.remove_node_ref(self)
+                    group.add_node_ref(self)
+                else:
+                    group.invalidate()
+
+            for node in nodes.values():
+                if node is not None:
+                    node.__update_in_cache(cache_sync)
+
+            self.__update_in_cache(cache_sync)  # updates in cache
 
     def print_data(self):
         """
@@ -1,5 +1,7 @@
+import logging
 import numbers
-from bisect import bisect_right
+import time
+from bisect import bisect_left, bisect_right
 
 
 class NodeRefGroup:
@@ -8,13 +10,29 @@ class NodeRefGroup:
 
     Members
     -------
+    owner: Node object
+        Node class type object owning self group
+    direction: string
+        "incoming" or "outgoing"
     _ref_lists: dict
         dictionary with keys as optimisation key and value as references to nodes sorted by that optimisation key
+    _ref_scores: dict
+        dictionary with keys as optimisation key and value as values of that key for nodes in _ref_lists (same order)
+    _lazy_keys: set
+        keys in _ref_lists which are sort indexes built on first use (not optimisation keys)
+    _version: int
+        incremented on every change of _ref_lists, used to key memoised query results
     _temp_list: list
         temporary node reference list for storing operations output (for function chaining)
+    _temp_ops: tuple
+        operations which produced _temp_list (for memoising query results)
+    _temp_started: float
+        time at which operations chain was started (for slow query log)
+    _temp_steps: list
+        measurements of operations which produced _temp_list (for explain/profile)
     """
 
-    def __init__(self, cache, optimisation_keys):
+    def __init__(self, cache, optimisation_keys, owner=None, direction=None):
         """
         Init method (constructor)
 
@@ -22,17 +40,32 @@ class NodeRefGroup:
         ----------
         optimisation_keys: list
             list of all optimisation keys
+        owner: Node object
+            Node class type object owning self group (optional)
+        direction: string
+            "incoming" or "outgoing" (optional)
         """
 
         self.cache = cache
+        self.owner = owner
+        self.direction = direction
         self._ref_lists = {}
+        self._ref_scores = {}
         for key in optimisation_keys:
             self._ref_lists[key] = []
+            self._ref_scores[key] = []
+        self._lazy_keys = set()
+        self._version = 0
         self._temp_list = None
+        self._temp_ops = None
+        self._temp_started = None
+        self._temp_steps = None
 
     def add_optimisation_key(self, key):
         """
         Add optimisation key to _ref_lists (for optimised search/sort on that key)
+        Existing nodes are fetched once to order them by the new key
+        (nodes without the key and expired nodes are left out of its list)
 
         Parameters
         ----------
@@ -40,7 +73,19 @@ class NodeRefGroup:
             add a new optimisation key to self object
         """
 
-        self._ref_lists[key] = []
+        self.__ensure_scores()
+
+        self.__build_list(key, self.get_all_node_refs())
+        self._lazy_keys.discard(key)
+        self._version += 1
+
+    def invalidate(self):
+        """
+        Mark self group as changed without changing its references (bumps version,
+        so memoised query results of self group are not used anymore)
+        """
+
+        self._version += 1
 
     def remove_node_ref(self, node):
         """
@@ -53,10 +98,41 @@ class NodeRefGroup:
 
         """
 
-        optimisation_keys = list(self._ref_lists.keys())
-        for key in optimisation_keys:
-            if node.cache_key in self._ref_lists[key]:
-                self._ref_lists[key].remove(node.cache_key)
+        self.remove_node_refs([node.cache_key])
+
+    def remove_node_refs(self, node_refs):
+        """
+        Remove many node references from _ref_lists in all optimisation keys, in one pass over each list
+
+        Parameters
+        ----------
+        node_refs: iterable
+            references of nodes to remove
+
+        Returns
+        -------
+        int
+            number of node references removed
+        """
+
+        self.__ensure_scores()
+        node_refs = set(node_refs)
+        removed = 0
+
+        for key in list(self._ref_lists.keys()):
+            entries = [
+                (node_ref, value)
+                for node_ref, value in zip(self._ref_lists[key], self._ref_scores[key])
+                if node_ref not in node_refs
+            ]
+            removed = max(removed, len(self._ref_lists[key]) - len(entries))
+            self._ref_lists[key] = [node_ref for node_ref, _ in entries]
+            self._ref_scores[key] = [value for _, value in entries]
+
+        if removed:
+            self._version += 1
+
+        return removed
 
     def add_node_ref(self, node):
         """
@@ -68,18 +144,57 @@ class NodeRefGroup:
             Node class type object to add to all lists of all optimisation key
         """
 
+        self.__ensure_scores()
         optimisation_keys = list(self._ref_lists.keys())
         for key in optimisation_keys:
+            # nodes without the key are not kept in sort indexes
+            if key in self._lazy_keys and key not in node.data:
+                continue
             self.__add_node_at_appr_pos(key, node)
+        self._version += 1
 
-    def sort_by(self, key):
+    def add_node_refs(self, entries):
         """
-        Sort by (any specified optimisation key)
+        Add many node references in _ref_lists in all optimisation keys, with one sort per key
+        (nodes are not fetched, values of optimisation keys are given with each reference)
+        Sort indexes of keys missing in any data dict are dropped, and built again on next
+        sort_by, as the added nodes can not be placed in them
 
         Parameters
         ----------
-        key: string
-            one of the optimisation key
+        entries: list
+            list of (node reference, data dict) tuples, data dict has values of all optimisation keys
+        """
+
+        self.__ensure_scores()
+        for key in list(self._ref_lists.keys()):
+            if key in self._lazy_keys and any(key not in data for _, data in entries):
+                del self._ref_lists[key]
+                del self._ref_scores[key]
+                self._lazy_keys.discard(key)
+                continue
+
+            merged = list(zip(self._ref_scores[key], self._ref_lists[key]))
+            merged.extend((data[key], node_ref) for node_ref, data in entries)
+            merged.sort(key=lambda entry: entry[0])
+            self._ref_lists[key] = [node_ref for _, node_ref in merged]
+            self._ref_scores[key] = [value for value, _ in merged]
+        self._version += 1
+
+    def sort_by(self, key, order="asc"):
+        """
+        Sort by any key, or by several keys (composite ordering)
+        Keys which are not optimisation keys get a sort index built on first use
+        (nodes are fetched once), which is kept with self group and maintained on add/remove
+        Nodes without the key are placed at the end
+
+        Parameters
+        ----------
+        key: string or list
+            key to sort by, or list of (key, order) tuples for composite ordering
+            example: [("bananas", "desc"), ("apples", "asc")]
+        order: string
+            "asc" or "desc", for single key (optional)
 
         Returns
         -------
@@ -87,19 +202,71 @@ class NodeRefGroup:
             self object with modified _temp_list, which stores the output
         """
 
-        if self._temp_list is None:
-            if key in self._ref_lists:
-                self._temp_list = self._ref_lists[key]
-            else:
-                self._temp_list = []
-
+        if isinstance(key, str):
+            sort_spec = ((key, order),)
         else:
+            sort_spec = tuple(
+                (item, "asc") if isinstance(item, str) else tuple(item) for item in key
+            )
+
+        for sort_key, sort_order in sort_spec:
+            if sort_order not in ("asc", "desc"):
+                raise Exception(
+                    "Error: order does not match, " + str(sort_order) + " given"
+                )
+
+        op = ("sort_by", sort_spec)
+        step = self.__start_step()
+        method = "index"
+        for sort_key, _ in sort_spec:
+            if sort_key not in self._ref_lists:
+                self.__build_sort_index(sort_key)
+                method = "build index"
+
+        if (
+            self._temp_list is None
+            and sort_spec == ((key, "asc"),)
+            and key not in self._lazy_keys
+        ):
+            self._temp_list = self._ref_lists[key]
+            self._temp_ops = (op,)
+            self._temp_started = step["started"]
+            self._temp_steps = []
+            self.__end_step(step, op, method)
+            return self
+
+        self.__start_chain()
+        if self.__recall(op):
+            self.__end_step(step, op, "memo")
+            return self
+        ops = self._temp_ops + (op,)
+
+        if sort_spec == ((key, "asc"),):
             # list of all filtered nodes
-            self._temp_list = [
-                node_ref
-                for node_ref in self._ref_lists[key]
-                if node_ref in self._temp_list
+            selected = set(self._temp_list)
+            node_refs = [
+                node_ref for node_ref in self._ref_lists[key] if node_ref in selected
             ]
+            if key in self._lazy_keys:
+                indexed = set(node_refs)
+                node_refs += [
+                    node_ref for node_ref in self._temp_list if node_ref not in indexed
+                ]
+
+        else:
+            # stable sort on each key, least significant first
+            node_refs = list(self._temp_list)
+            for sort_key, sort_order in reversed(sort_spec):
+                values = self.__get_values(sort_key)
+                present = [node_ref for node_ref in node_refs if node_ref in values]
+                present.sort(key=values.__getitem__, reverse=(sort_order == "desc"))
+                node_refs = present + [
+                    node_ref for node_ref in node_refs if node_ref not in values
+                ]
+
+        self._temp_list = node_refs
+        self.__memoise(ops)
+        self.__end_step(step, op, method)
 
         return self
 
@@ -124,137 +291,239 @@ class NodeRefGroup:
             self object with modified _temp_list, which stores the output
         """
 
-        if self._temp_list is None:
-            optimisation_keys = list(self._ref_lists.keys())
-            self._temp_list = self._ref_lists[optimisation_keys[0]]
+        self.__start_chain()
+        step = self.__start_step()
 
-        # less than
-        if operator == "lt":
-            assert isinstance(input1, numbers.Real), (
-                "Error: numerical value required, " + str(input1) + " given"
-            )
+        op = ("filter_by", key, _freeze(input1), operator)
+        if self.__recall(op):
+            self.__end_step(step, op, "memo")
+            return self
+        ops = self._temp_ops + (op,)
+
+        matches = get_matcher(input1, operator)
 
+        if key in self._ref_lists:
+            # optimisation key, stored values are compared without fetching nodes
+            method = "index"
+            values = self.__get_values(key)
             self._temp_list = [
-                node.cache_key
-                for node in self.get_all_nodes()
-                if node.data[key] < input1
+                node_ref
+                for node_ref in self._temp_list
+                if node_ref in values and matches(values[node_ref])
             ]
 
-        # less than or equal to
-        elif operator == "le":
-            assert isinstance(input1, numbers.Real), (
-                "Error: numerical value required, " + str(input1) + " given"
-            )
-
+        else:
+            method = "scan"
             self._temp_list = [
                 node.cache_key
-                for node in self.get_all_nodes()
-                if node.data[key] <= input1
+                for node in self.__get_nodes(self._temp_list)
+                if matches(node.data[key])
             ]
 
-        # greater than
-        elif operator == "gt":
-            assert isinstance(input1, numbers.Real), (
-                "Error: numerical value required, " + str(input1) + " given"
-            )
+        self.__memoise(ops)
+        self.__end_step(step, op, method)
 
-            self._temp_list = [
-                node.cache_key
-                for node in self.get_all_nodes()
-                if node.data[key] > input1
-            ]
+        return self
 
-        # greater than or equal to
-        elif operator == "ge":
-            assert isinstance(input1, numbers.Real), (
-                "Error: numerical value required, " + str(input1) + " given"
-            )
+    def get_all_nodes(self):
+        """
+        Get all nodes (if method chaining is done, it will return nodes for previous operations)
 
-            self._temp_list = [
-                node.cache_key
-                for node in self.get_all_nodes()
-                if node.data[key] >= input1
-            ]
+        Returns
+        -------
+        list
+            list of Node objects (if method chaining is done, it will return nodes for previous operations)
+            example:
+            node.get_outgoing().filter_by("bananas", [10]).get_all_nodes()
+            will give list of outgoing nodes with node.data['bananas'] equal to 10
+        """
 
-        # not equal to
-        elif operator == "ne":
-            assert isinstance(input1, (list)), (
-                "Error: value must be list of numbers, " + str(input1) + " given"
-            )
+        self.__start_chain()
+        nodes = self.__get_nodes(self._temp_list)
+        self.__end_chain()
 
-            self._temp_list = [
-                node.cache_key
-                for node in self.get_all_nodes()
-                if node.data[key] not in input1
-            ]
+        return nodes
 
-        # equal to
-        elif operator == "eq":
-            assert isinstance(input1, (list)), (
-                "Error: value must be list of numbers, " + str(input1) + " given"
-            )
+    def get_index_keys(self):
+        """
+        Get keys whose values are stored with self group (optimisation keys and keys with
+        sort index), filter_by and sort_by on these keys do not fetch nodes
 
-            self._temp_list = [
-                node.cache_key
-                for node in self.get_all_nodes()
-                if node.data[key] in input1
-            ]
+        Returns
+        -------
+        list
+            list of keys
+        """
 
-        # between range
-        elif operator == "range":
-            assert isinstance(input1, (list)) and len(input1) == 2, (
-                "Error: input must be a list with two values defining the range, "
-                + str(input1)
-                + " given"
-            )
+        return list(self._ref_lists.keys())
 
-            self._temp_list = [
-                node.cache_key
-                for node in self.get_all_nodes()
-                if ((node.data[key] >= input1[0]) and (node.data[key] <= input1[1]))
-            ]
+    def get_all_node_refs(self):
+        """
+        Get references of all nodes, without fetching the nodes
+        (if method chaining is done, it will return references for previous operations)
 
-        # in array list
-        elif operator == "in":
-            assert isinstance(input1, (list)), (
-                "Error: input must be a list, " + str(input1) + " given"
-            )
+        Returns
+        -------
+        list
+            list of node references (expired node references are not removed)
+        """
 
-            self._temp_list = [
-                node.cache_key
-                for node in self.get_all_nodes()
-                if (node.data[key] in input1)
-            ]
+        self.__start_chain()
+        node_refs = list(self._temp_list)
+        self.__end_chain()
+
+        return node_refs
+
+    def count(self):
+        """
+        Count nodes, without fetching them
+        (if method chaining is done, it will count nodes for previous operations)
+
+        Returns
+        -------
+        int
+            number of node references (references of expired nodes are counted too)
+            example:
+            node.get_outgoing().filter_by("bananas", 10, "gt").count()
+            will give number of outgoing nodes with node.data['bananas'] greater than 10
+        """
+
+        self.__start_chain()
+        count = len(self._temp_list)
+        self.__end_chain()
+
+        return count
+
+    def min(self, key):
+        """
+        Get minimum value of a key, without fetching nodes
+        (if method chaining is done, it will consider nodes for previous operations)
+
+        Parameters
+        ----------
+        key: string
+            optimisation key, or any other key (sort index is built on first use)
+
+        Returns
+        -------
+        number or None
+            minimum value, None if there are no nodes
+        """
+
+        values = self.__get_sorted_values(key)
+
+        return values[0] if values else None
+
+    def max(self, key):
+        """
+        Get maximum value of a key, without fetching nodes
+        (if method chaining is done, it will consider nodes for previous operations)
+
+        Parameters
+        ----------
+        key: string
+            optimisation key, or any other key (sort index is built on first use)
+
+        Returns
+        -------
+        number or None
+            maximum value, None if there are no nodes
+        """
+
+        values = self.__get_sorted_values(key)
+
+        return values[-1] if values else None
+
+    def histogram(self, key, bins=10):
+        """
+        Get histogram of values of a key, without fetching nodes
+        (if method chaining is done, it will consider nodes for previous operations)
 
+        Parameters
+        ----------
+        key: string
+            optimisation key, or any other key (sort index is built on first use)
+        bins: int or list
+            number of equal width bins between minimum and maximum value,
+            or sorted list of bin edges
+
+        Returns
+        -------
+        list
+            list of (lower edge, upper edge, count) tuples, bins include lower edge,
+            last bin includes upper edge too (values outside bin edges are not counted)
+            example:
+            node.get_outgoing().histogram("bananas", [0, 5, 10])
+            will give [(0, 5, count of 0 <= bananas < 5), (5, 10, count of 5 <= bananas <= 10)]
+        """
+
+        values = self.__get_sorted_values(key)
+
+        if isinstance(bins, numbers.Integral):
+            assert bins > 0, "Error: number of bins must be positive"
+            if not values:
+                return []
+            lowest, highest = values[0], values[-1]
+            width = (highest - lowest) / bins
+            edges = [lowest + width * i for i in range(bins)] + [highest]
         else:
-            raise Exception(
-                "Error: operator does not match, " + str(operator) + " given"
+            edges = list(bins)
+
+        histogram = []
+        for i in range(len(edges) - 1):
+            if i == len(edges) - 2:
+                upper_pos = bisect_right(values, edges[i + 1])
+            else:
+                upper_pos = bisect_left(values, edges[i + 1])
+            histogram.append(
+                (edges[i], edges[i + 1], upper_pos - bisect_left(values, edges[i]))
             )
 
-        return self
+        return histogram
 
-    def get_all_nodes(self):
+    def explain(self):
         """
-        Get all nodes (if method chaining is done, it will return nodes for previous operations)
+        Report steps of current operations chain as they ran, without fetching resulting nodes
+        (filter_by/sort_by run when called, so the chain has run already; resets the chain)
 
         Returns
         -------
         list
-            list of Node objects (if method chaining is done, it will return nodes for previous operations)
+            one dict per operation, with op (description), method ("index" for stored
+            values, "scan" for fetching nodes, "build index" for a sort index built on first use,
+            "memo" for a result answered from query cache), input and output (number of
+            references), redis_calls, bytes_read, deserialization_time and time (seconds)
             example:
-            node.get_outgoing().filter_by("bananas", [10]).get_all_nodes()
-            will give list of outgoing nodes with node.data['bananas'] equal to 10
+            node.get_outgoing().filter_by("name", ["Tom"]).sort_by("bananas").explain()
         """
 
-        if self._temp_list is None:
-            optimisation_keys = list(self._ref_lists.keys())
-            self._temp_list = self._ref_lists[optimisation_keys[0]]
+        self.__start_chain()
+        steps = self._temp_steps
+        self.__end_chain()
 
-        # expired node ref keys still exist in _ref_lists
-        nodes = filter(None, map(lambda x: self.cache.get(x, True), self._temp_list))
-        self._temp_list = None  # reset _temp_list
+        return steps
 
-        return list(nodes)
+    def profile(self):
+        """
+        Fetch resulting nodes of current operations chain and report all steps as they ran
+        (resets the chain)
+
+        Returns
+        -------
+        list
+            steps as in explain and a last one for fetching nodes ("get_all_nodes()",
+            method "fetch"), with dead (number of expired references) in addition
+        """
+
+        self.__start_chain()
+        step = self.__start_step()
+        nodes = self.__get_nodes(self._temp_list)
+        self.__end_step(step, "get_all_nodes()", "fetch", len(nodes))
+        self._temp_steps[-1]["dead"] = step["input"] - len(nodes)
+        steps = self._temp_steps
+        self.__end_chain()
+
+        return steps
 
     def get_node_indexed_at(self, index):
         """
@@ -274,19 +543,352 @@ class NodeRefGroup:
             will give node at index 3 from list of outgoing nodes with node.data['bananas'] equal to 10
         """
 
-        if self._temp_list is None:
-            optimisation_keys = list(self._ref_lists.keys())
-            self._temp_list = self._ref_lists[optimisation_keys[0]]
+        self.__start_chain()
 
         if len(self._temp_list) > index:
             node = self.cache.get(self._temp_list[index])
-            self._temp_list = None  # reset _temp_list
+            self.__end_chain()
 
             return node
 
         else:
             raise Exception("Index Error: " + index + " is not found")
 
+    def __start_chain(self):
+        """
+        Start operations chain from default optimisation key's list, if not started
+        (private method)
+        """
+
+        if self._temp_list is None:
+            optimisation_keys = list(self._ref_lists.keys())
+            self._temp_list = self._ref_lists[optimisation_keys[0]]
+            self._temp_ops = ()
+            self._temp_started = time.perf_counter()
+            self._temp_steps = []
+
+    def __end_chain(self):
+        """
+        Reset operations chain, and report it to slow query log if it took longer than threshold
+        (private method)
+        """
+
+        started = self._temp_started
+        steps = self._temp_steps or []
+        self._temp_list = None  # reset _temp_list
+        self._temp_ops = None
+        self._temp_started = None
+        self._temp_steps = None
+
+        threshold = self.cache.slow_query_threshold
+        if threshold is None or started is None:
+            return
+
+        elapsed = time.perf_counter() - started
+        if elapsed >= threshold:
+            self.cache.slow_query_hook(
+                {
+                    "node": getattr(self.owner, "cache_key", None),
+                    "direction": self.direction,
+                    "ops": [step["op"] for step in steps],
+                    "steps": steps,
+                    "time": elapsed,
+                }
+            )
+
+    def __get_nodes(self, node_refs):
+        """
+        Fetch nodes
+        (private method)
+
+        Parameters
+        ----------
+        node_refs: list
+            references of nodes
+
+        Returns
+        -------
+        list
+            list of Node objects (expired nodes are left out)
+        """
+
+        # expired node ref keys still exist in _ref_lists
+        return [node for node in self.cache.get_many(node_refs) if node is not None]
+
+    def __start_step(self):
+        """
+        Start measuring an operation of the chain
+        (private method)
+
+        Returns
+        -------
+        dict
+            input (number of references), start time and stats counters
+        """
+
+        if self._temp_list is not None:
+            input_count = len(self._temp_list)
+        else:
+            input_count = len(next(iter(self._ref_lists.values())))
+
+        return {
+            "input": input_count,
+            "started": time.perf_counter(),
+            "stats": dict(self.cache.stats),
+        }
+
+    def __end_step(self, step, op, method, output_count=None):
+        """
+        Add measurements of an operation to the chain's steps
+        (private method)
+
+        Parameters
+        ----------
+        step: dict
+            returned by __start_step
+        op: tuple or string
+            operation recorded in _temp_ops, or description
+        method: string
+            "index", "scan", "build index", "memo" or "fetch"
+        output_count: int
+            number of results, default length of _temp_list
+        """
+
+        stats = self.cache.stats
+        self._temp_steps.append(
+            {
+                "op": op if isinstance(op, str) else _describe(op),
+                "method": method,
+                "input": step["input"],
+                "output": (
+                    len(self._temp_list) if output_count is None else output_count
+                ),
+                "redis_calls": stats["calls"] - step["stats"]["calls"],
+                "bytes_read": stats["bytes_read"] - step["stats"]["bytes_read"],
+                "deserialization_time": stats["deserialization_time"]
+                - step["stats"]["deserialization_time"],
+                "time": time.perf_counter() - step["started"],
+            }
+        )
+
+    def __get_values(self, key):
+        """
+        Get stored values of an optimisation key
+        (private method)
+
+        Parameters
+        ----------
+        key: string
+            one of the optimisation key
+
+        Returns
+        -------
+        dict
+            node reference -> value of key
+        """
+
+        self.__ensure_scores()
+
+        return dict(zip(self._ref_lists[key], self._ref_scores[key]))
+
+    def __get_sorted_values(self, key):
+        """
+        Get sorted stored values of an optimisation key for nodes in chain, and reset chain
+        (private method)
+
+        Parameters
+        ----------
+        key: string
+            one of the optimisation key
+
+        Returns
+        -------
+        list
+            sorted list of values
+        """
+
+        if key not in self._ref_lists:
+            self.__build_sort_index(key)
+
+        self.__ensure_scores()
+        self.__start_chain()
+
+        if self._temp_list is self._ref_lists[key] or not self._temp_ops:
+            values = list(self._ref_scores[key])
+        else:
+            selected = set(self._temp_list)
+            values = [
+                value
+                for node_ref, value in zip(self._ref_lists[key], self._ref_scores[key])
+                if node_ref in selected
+            ]
+
+        self.__end_chain()
+
+        return values
+
+    def __ensure_scores(self):
+        """
+        Rebuild _ref_scores for groups stored before values were kept, by fetching nodes
+        (references of expired nodes are dropped)
+        (private method)
+        """
+
+        if self._ref_scores is not None:
+            return
+
+        self._ref_scores = {}
+        for key, node_refs in list(self._ref_lists.items()):
+            self.__build_list(key, node_refs)
+
+    def __build_sort_index(self, key):
+        """
+        Build sort index of a key which is not an optimisation key, from all nodes of self group
+        and store it with owner node in cache, if owner node has not changed meanwhile
+        (private method)
+
+        Parameters
+        ----------
+        key: string
+            any of the keys in node.data
+        """
+
+        self.__ensure_scores()
+        optimisation_keys = list(self._ref_lists.keys())
+        self.__build_list(key, list(self._ref_lists[optimisation_keys[0]]))
+        self._lazy_keys.add(key)
+
+        owner_ref = getattr(self.owner, "cache_key", None)
+        if owner_ref is None:
+            return
+
+        owner = self.cache.get(owner_ref, True, use_local=False)
+        if owner is None:
+            return
+
+        if self.direction == "incoming":
+            group = owner.incoming_node_refs_list
+        else:
+            group = owner.outgoing_node_refs_list
+
+        ttl = owner.get_ttl()
+        if (
+            group._version == self._version
+            and group._ref_scores is not None
+            and ttl != 0
+        ):
+            group._ref_lists[key] = self._ref_lists[key]
+            group._ref_scores[key] = self._ref_scores[key]
+            group._lazy_keys.add(key)
+            self.cache.set(owner_ref, owner, ttl)
+
+    def __build_list(self, key, node_refs):
+        """
+        Build sorted _ref_lists and _ref_scores entries of given key, by fetching nodes
+        (nodes without the key and expired nodes are left out)
+        (private method)
+
+        Parameters
+        ----------
+        key: string
+            optimisation key
+        node_refs: list
+            references of nodes to add
+        """
+
+        entries = sorted(
+            (
+                (node.data[key], node.cache_key)
+                for node in self.cache.get_many(node_refs)
+                if node is not None and key in node.data
+            ),
+            key=lambda entry: entry[0],
+        )
+        self._ref_lists[key] = [node_ref for _, node_ref in entries]
+        self._ref_scores[key] = [value for value, _ in entries]
+
+    def __query_key(self, ops):
+        """
+        Key of memoised result for given operations on self group
+        (private method)
+
+        Parameters
+        ----------
+        ops: tuple
+            operations chain
+
+        Returns
+        -------
+        tuple or None
+            None if query results are not memoised
+        """
+
+        owner_ref = getattr(self.owner, "cache_key", None)
+        if self.cache.query_cache is None or owner_ref is None:
+            return None
+
+        return (owner_ref, self.direction, self._version, ops)
+
+    def __recall(self, op):
+        """
+        Apply memoised result of current chain followed by op to _temp_list, if any
+        (private method)
+
+        Parameters
+        ----------
+        op: tuple
+            operation to apply
+
+        Returns
+        -------
+        bool
+            True if memoised result was applied
+        """
+
+        query_key = self.__query_key(self._temp_ops + (op,))
+        if query_key is None:
+            return False
+
+        result = self.cache.query_cache.get(query_key)
+        if result is None:
+            return False
+
+        self._temp_list = result
+        self._temp_ops = query_key[3]
+
+        return True
+
+    def __memoise(self, ops):
+        """
+        Memoise _temp_list as result of given operations
+        (private method)
+
+        Parameters
+        ----------
+        ops: tuple
+            operations chain which produced _temp_list
+        """
+
+        self._temp_ops = ops
+        query_key = self.__query_key(ops)
+        if query_key is not None:
+            self.cache.query_cache.set(query_key, self._temp_list)
+
+    def __setstate__(self, d):
+        """
+        Required for unpickling groups stored before owner/version members existed
+        """
+
+        self.__dict__ = d
+        self.__dict__.setdefault("owner", None)
+        self.__dict__.setdefault("direction", None)
+        self.__dict__.setdefault("_version", 0)
+        self.__dict__.setdefault("_ref_scores", None)
+        self.__dict__.setdefault("_lazy_keys", set())
+        self.__dict__.setdefault("_temp_ops", None)
+        self.__dict__.setdefault("_temp_started", None)
+        self.__dict__.setdefault("_temp_steps", None)
+
     def __add_node_at_appr_pos(self, key, node_to_add):
         """
         Adds reference of node (ie node.cache_key) at appropriate index in sorted _ref_lists for given optimisation key
@@ -300,17 +902,176 @@ class NodeRefGroup:
             Node class type object to add in 'key' optimisation key's list of nodes
         """
 
-        nodes = self.sort_by(key).get_all_nodes()
+        # stored values are kept sorted, so no node has to be fetched
+        pos = bisect_right(self._ref_scores[key], node_to_add.data[key])
+        self._ref_lists[key].insert(pos, node_to_add.cache_key)
+        self._ref_scores[key].insert(pos, node_to_add.data[key])
 
-        if nodes:
-            # list of all node values of given key
-            list_of_values = list(
-                filter(None, ((yield node.data[key]) for node in nodes))
-            )
 
-            # get appropriate position and insert
-            pos = bisect_right(list_of_values, node_to_add.data[key])
-            self._ref_lists[key].insert(pos, node_to_add.cache_key)
+def get_matcher(input1, operator="eq"):
+    """
+    Get predicate on a value for filter input and operator (see NodeRefGroup.filter_by)
 
-        else:
-            self._ref_lists[key].append(node_to_add.cache_key)
+    Parameters
+    ----------
+    input1: list
+        list of values (value supports numerical values only)
+    operator: string
+        any of "lt", "le", "gt", "ge", "ne", "eq", "range", "in"
+
+    Returns
+    -------
+    function
+        called with value of node.data[key], returns True if it matches
+    """
+
+    # less than
+    if operator == "lt":
+        assert isinstance(input1, numbers.Real), (
+            "Error: numerical value required, " + str(input1) + " given"
+        )
+
+        matches = lambda value: value < input1
+
+    # less than or equal to
+    elif operator == "le":
+        assert isinstance(input1, numbers.Real), (
+            "Error: numerical value required, " + str(input1) + " given"
+        )
+
+        matches = lambda value: value <= input1
+
+    # greater than
+    elif operator == "gt":
+        assert isinstance(input1, numbers.Real), (
+            "Error: numerical value required, " + str(input1) + " given"
+        )
+
+        matches = lambda value: value > input1
+
+    # greater than or equal to
+    elif operator == "ge":
+        assert isinstance(input1, numbers.Real), (
+            "Error: numerical value required, " + str(input1) + " given"
+        )
+
+        matches = lambda value: value >= input1
+
+    # not equal to
+    elif operator == "ne":
+        assert isinstance(input1, (list)), (
+            "Error: value must be list of numbers, " + str(input1) + " given"
+        )
+
+        matches = lambda value: value not in input1
+
+    # equal to
+    elif operator == "eq":
+        assert isinstance(input1, (list)), (
+            "Error: value must be list of numbers, " + str(input1) + " given"
+        )
+
+        matches = lambda value: value in input1
+
+    # between range
+    elif operator == "range":
+        assert isinstance(input1, (list)) and len(input1) == 2, (
+            "Error: input must be a list with two values defining the range, "
+            + str(input1)
+            + " given"
+        )
+
+        matches = lambda value: input1[0] <= value <= input1[1]
+
+    # in array list
+    elif operator == "in":
+        assert isinstance(input1, (list)), (
+            "Error: input must be a list, " + str(input1) + " given"
+        )
+
+        matches = lambda value: value in input1
+
+    else:
+        raise Exception("Error: operator does not match, " + str(operator) + " given")
+
+    return matches
+
+
+def _freeze(value):
+    """
+    Hashable form of filter input (lists become tuples)
+
+    Parameters
+    ----------
+    value: any type
+
+    Returns
+    -------
+    hashable value
+    """
+
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+
+    return value
+
+
+def _thaw(value):
+    """
+    Filter input from its hashable form (tuples become lists)
+
+    Parameters
+    ----------
+    value: hashable value
+
+    Returns
+    -------
+    any type
+    """
+
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+
+    return value
+
+
+def _describe(op):
+    """
+    Readable description of recorded operation
+
+    Parameters
+    ----------
+    op: tuple
+        operation recorded in _temp_ops
+
+    Returns
+    -------
+    string
+        example: "filter_by('apples', [1], 'eq')"
+    """
+
+    if op[0] == "filter_by":
+        args = [op[1], _thaw(op[2]), op[3]]
+    else:
+        args = [list(op[1])]
+
+    return op[0] + "(" + ", ".join(repr(arg) for arg in args) + ")"
+
+
+def log_slow_query(query):
+    """
+    Default slow query log hook, logs query with 'graphcache' logger
+
+    Parameters
+    ----------
+    query: dict
+        node, direction, ops, steps (see NodeRefGroup.explain) and time of slow query
+    """
+
+    logging.getLogger("graphcache").warning(
+        "slow query (%.3fs) on %s %s: %s",
+        query["time"],
+        query["node"],
+        query["direction"],
+        ".".join(query["ops"]) or "get all",
+    )
@@ -2,6 +2,58 @@ import string
 import random
 import redis
 import pickle
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# header byte tagging compressed payloads
+# uncompressed payloads are plain pickles, which always start with b"\x80" (PROTO)
+COMPRESSION_HEADERS = {"zlib": b"\x01", "lz4": b"\x02", "zstd": b"\x03"}
+
+# access counts are sent to access counter after these many reads,
+# or on first read after these many seconds since last flush
+ACCESS_FLUSH_READS = 1000
+ACCESS_FLUSH_SECONDS = 10
+
+
+class BatchSession(threading.local):
+    """
+    BatchSession class
+    State of open batch session (see Cache.batch), separate for each thread
+
+    Members
+    -------
+    writes: dict
+        pending writes, key -> (value, ttl) or None for removal, None if no session is open
+    depth: int
+        number of nested sessions open
+    transaction: bool
+        flush as a MULTI/EXEC transaction
+    events: list
+        change events of the session, published on flush
+    """
+
+    def __init__(self):
+        """
+        Init method (constructor), called once in each thread using the object
+        """
+
+        self.writes = None
+        self.depth = 0
+        self.transaction = False
+        self.events = []
 
 
 class Cache:
@@ -10,7 +62,29 @@ class Cache:
 
     """
 
-    def __init__(self, host="localhost", port=6379, db=0):
+    def __init__(
+        self,
+        host="localhost",
+        port=6379,
+        db=0,
+        compression=None,
+        compression_threshold=1024,
+        compression_level=None,
+    ):
+        """
+        Init method (constructor)
+
+        Parameters
+        ----------
+        compression: string
+            codec for payloads, one of "zlib", "lz4", "zstd" (optional)
+            lz4 and zstd need the lz4 and zstandard packages
+        compression_threshold: int
+            payloads smaller than this (in bytes) are stored uncompressed
+        compression_level: int
+            codec specific compression level (optional)
+        """
+
         # Redis client
         try:
             self.host = host
@@ -20,6 +94,93 @@ class Cache:
         except Exception:
             raise Exception("Cache Error: Failed to connect to server")
 
+        if compression is not None and compression not in COMPRESSION_HEADERS:
+            raise Exception(
+                "Cache Error: unsupported compression, " + str(compression) + " given"
+            )
+        if compression == "lz4" and lz4_frame is None:
+            raise Exception("Cache Error: lz4 compression requires lz4 package")
+        if compression == "zstd" and zstandard is None:
+            raise Exception("Cache Error: zstd compression requires zstandard package")
+
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+
+        self.__init_session()
+
+    def __init_session(self):
+        """
+        Initialise client side session state (not pickled)
+        (private method)
+        """
+
+        # batch session of each thread, see BatchSession
+        self._batch = BatchSession()
+
+        # QueryCache object memoising NodeRefGroup query results, if enabled
+        self.query_cache = None
+
+        # ChangeFeed object for publishing mutation events, if enabled
+        self.change_feed = None
+
+        # LocalCache object keeping payloads client side, if enabled
+        self.local_cache = None
+
+        # key of sorted set counting reads per key, if enabled
+        self.access_counter = None
+        self._access_counts = Counter()
+        self._access_reads = 0
+        self._access_flushed_at = time.monotonic()
+        self.access_flush_reads = ACCESS_FLUSH_READS
+        self.access_flush_seconds = ACCESS_FLUSH_SECONDS
+
+        # seconds after which a NodeRefGroup query is reported to slow_query_hook, if enabled
+        self.slow_query_threshold = None
+        self.slow_query_hook = None
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Reset stats counters
+        """
+
+        self.stats = {
+            "calls": 0,
+            "reads": 0,
+            "writes": 0,
+            "bytes_read": 0,
+            "bytes_written": 0,
+            "compressed_reads": 0,
+            "compressed_writes": 0,
+            "bytes_before_compression": 0,
+            "bytes_after_compression": 0,
+            "compression_time": 0.0,
+            "decompression_time": 0.0,
+            "deserialization_time": 0.0,
+        }
+
+    def get_stats(self):
+        """
+        Get stats counters
+
+        Returns
+        -------
+        dict
+            copy of stats counters, with 'compression_ratio' (uncompressed / compressed size
+            of compressed writes, None if nothing was compressed)
+        """
+
+        stats = dict(self.stats)
+        stats["compression_ratio"] = None
+        if stats["bytes_after_compression"]:
+            stats["compression_ratio"] = (
+                stats["bytes_before_compression"] / stats["bytes_after_compression"]
+            )
+
+        return stats
+
     def get_random_key(self, size=6, chars=string.ascii_uppercase + string.digits):
         """
         Get random key
@@ -51,18 +212,23 @@ class Cache:
         string
         """
 
-        if ttl is None:
-            self.cache.set(key, pickle.dumps(value))
+        if ttl is not None and ttl <= 0:
+            raise Exception("Value Error: TTL must be positive")
 
-        elif ttl > 0:
-            self.cache.set(key, pickle.dumps(value), ex=ttl)
+        # deferred till the batch session is flushed, last write wins
+        if self._batch.writes is not None:
+            self._batch.writes[key] = (value, ttl)
 
         else:
-            raise Exception("Value Error: TTL must be positive")
+            payload = self.__dumps(value)
+            self.cache.set(key, payload, ex=ttl)
+            self.stats["calls"] += 1
+            if self.local_cache is not None:
+                self.local_cache.set(key, payload)
 
         return key
 
-    def get(self, key, silent=False):
+    def get(self, key, silent=False, use_local=True):
         """
         Get value by key from cache
 
@@ -70,6 +236,9 @@ class Cache:
         ----------
         key: string
         silent: bool
+        use_local: bool
+            read from local cache, if enabled, default true
+            (values read to be modified and written back must not use it, they can be stale)
 
         Returns
         -------
@@ -78,20 +247,92 @@ class Cache:
         """
 
         try:
-            value_obj = self.cache.get(key)
-            if value_obj is None:
-                raise Exception("Value not found")
-            value = pickle.loads(value_obj)
-            if value.__class__.__name__ in ("GraphCache", "Node", "NodeRef"):
-                value.cache = self
+            if self._batch.writes is not None and key in self._batch.writes:
+                # read own pending write, as a copy like any other read
+                if self._batch.writes[key] is None:
+                    raise Exception("Value removed")
+                value = pickle.loads(pickle.dumps(self._batch.writes[key][0]))
+            else:
+                value_obj = None
+                if self.local_cache is not None and use_local:
+                    value_obj = self.local_cache.get(key)
+                if value_obj is None:
+                    value_obj = self.cache.get(key)
+                    self.stats["calls"] += 1
+                    if value_obj is not None and self.local_cache is not None:
+                        self.local_cache.set(key, value_obj)
+                if value_obj is None:
+                    raise Exception("Value not found")
+                value = self.__loads(value_obj)
+            value = self.__bind(value)
 
         except Exception:
             if silent:
                 return None
             raise Exception("Cache Exception: " + key + " is not found")
 
+        if value.__class__.__name__ == "Node":
+            self.__count_access([key])
+
         return value
 
+    def get_many(self, keys, count_access=True, use_local=True):
+        """
+        Get values for many keys from cache in one round trip
+
+        Parameters
+        ----------
+        keys: list
+            list of keys
+        count_access: bool
+            count reads in access counter, if enabled, default true
+        use_local: bool
+            read from local cache, if enabled, default true (see get)
+
+        Returns
+        -------
+        list
+            values in order of keys, None for keys which are not found
+        """
+
+        keys = list(keys)
+        values = [None] * len(keys)
+        to_fetch = []
+
+        for index, key in enumerate(keys):
+            if self._batch.writes is not None and key in self._batch.writes:
+                # read own pending write, as a copy like any other read
+                if self._batch.writes[key] is not None:
+                    values[index] = self.__bind(
+                        pickle.loads(pickle.dumps(self._batch.writes[key][0]))
+                    )
+            elif self.local_cache is not None and use_local:
+                value_obj = self.local_cache.get(key)
+                if value_obj is not None:
+                    values[index] = self.__bind(self.__loads(value_obj))
+                else:
+                    to_fetch.append(index)
+            else:
+                to_fetch.append(index)
+
+        if to_fetch:
+            value_objs = self.cache.mget([keys[index] for index in to_fetch])
+            self.stats["calls"] += 1
+            for index, value_obj in zip(to_fetch, value_objs):
+                if value_obj is not None:
+                    values[index] = self.__bind(self.__loads(value_obj))
+                    if self.local_cache is not None:
+                        self.local_cache.set(keys[index], value_obj)
+
+        if count_access:
+            self.__count_access(
+                key
+                for key, value in zip(keys, values)
+                if value.__class__.__name__ == "Node"
+            )
+
+        return values
+
     def remove(self, key):
         """
         Remove key-value pair from cache
@@ -101,12 +342,270 @@ class Cache:
         key: string
         """
 
+        if self._batch.writes is not None:
+            self._batch.writes[key] = None
+            return
+
+        if self.local_cache is not None:
+            self.local_cache.discard(key)
+
         try:
+            self.stats["calls"] += 1
             self.cache.delete(key)
 
         except Exception:
             pass
 
+    @contextmanager
+    def batch(self, transaction=False):
+        """
+        Batch session (unit of work)
+        Writes and removals inside the session are kept client side, repeated writes
+        to a key are merged and everything is flushed in one pipelined round on exit.
+        Pending writes are discarded if the session exits with an exception.
+        Nested sessions join the outermost one.
+        Sessions are per thread, writes of other threads sharing self object are not batched.
+
+        Parameters
+        ----------
+        transaction: bool
+            flush as a MULTI/EXEC transaction, default false
+        """
+
+        self._batch.depth += 1
+        if self._batch.depth == 1:
+            self._batch.writes = {}
+            self._batch.events = []
+            self._batch.transaction = transaction
+
+        try:
+            yield self
+            if self._batch.depth == 1:
+                self.flush()
+
+        finally:
+            self._batch.depth -= 1
+            if self._batch.depth == 0:
+                self._batch.writes = None
+                self._batch.events = []
+
+    def flush(self):
+        """
+        Flush pending writes (and change events) of the open batch session in one pipelined round
+
+        Returns
+        -------
+        int
+            number of keys written or removed
+        """
+
+        if not self._batch.writes and not self._batch.events:
+            return 0
+
+        writes = self._batch.writes
+        events = self._batch.events
+        self._batch.writes = {}
+        self._batch.events = []
+
+        payloads = {}
+        pipe = self.cache.pipeline(transaction=self._batch.transaction)
+        for key, entry in writes.items():
+            if entry is None:
+                pipe.delete(key)
+            else:
+                payloads[key] = self.__dumps(entry[0])
+                pipe.set(key, payloads[key], ex=entry[1])
+        for event in events:
+            pipe.xadd(
+                self.change_feed.stream_key, event, maxlen=self.change_feed.maxlen
+            )
+        pipe.execute()
+        self.stats["calls"] += 1
+
+        if self.local_cache is not None:
+            for key in writes:
+                if key in payloads:
+                    self.local_cache.set(key, payloads[key])
+                else:
+                    self.local_cache.discard(key)
+
+        return len(writes)
+
+    def flush_access_counts(self):
+        """
+        Add reads counted since last flush to access counter (sorted set), in one pipelined round
+        """
+
+        if self.access_counter is None or not self._access_counts:
+            return
+
+        counts = self._access_counts
+        self._access_counts = Counter()
+        self._access_reads = 0
+        self._access_flushed_at = time.monotonic()
+
+        pipe = self.cache.pipeline(transaction=False)
+        for key, count in counts.items():
+            pipe.zincrby(self.access_counter, count, key)
+        pipe.execute()
+        self.stats["calls"] += 1
+
+    def __count_access(self, keys):
+        """
+        Count reads of node keys, flushed to access counter every access_flush_reads reads
+        or on first read after access_flush_seconds since last flush
+        (private method)
+
+        Parameters
+        ----------
+        keys: iterable
+        """
+
+        if self.access_counter is None:
+            return
+
+        for key in keys:
+            self._access_counts[key] += 1
+            self._access_reads += 1
+
+        if (
+            self._access_reads >= self.access_flush_reads
+            or time.monotonic() - self._access_flushed_at >= self.access_flush_seconds
+        ):
+            self.flush_access_counts()
+
+    def publish(self, op, **fields):
+        """
+        Append graph mutation event to change feed stream, if change feed is enabled
+        (inside a batch session, events are appended when the session is flushed)
+
+        Parameters
+        ----------
+        op: string
+            name of mutation, example: "add_edge"
+        fields: dict
+            event fields, example: node="graphcache-MZ5SQR"
+        """
+
+        if self.change_feed is None:
+            return
+
+        event = self.change_feed.event(op, **fields)
+        if self._batch.writes is not None:
+            self._batch.events.append(event)
+        else:
+            self.cache.xadd(
+                self.change_feed.stream_key, event, maxlen=self.change_feed.maxlen
+            )
+            self.stats["calls"] += 1
+
+    def __dumps(self, value):
+        """
+        Serialise value, compressed if configured and above compression threshold
+        (private method)
+
+        Parameters
+        ----------
+        value: any data type
+
+        Returns
+        -------
+        bytes
+        """
+
+        payload = pickle.dumps(value)
+
+        if self.compression is not None and len(payload) >= self.compression_threshold:
+            start = time.perf_counter()
+            if self.compression == "zlib":
+                level = self.compression_level
+                compressed = zlib.compress(payload, -1 if level is None else level)
+            elif self.compression == "lz4":
+                compressed = lz4_frame.compress(
+                    payload, compression_level=self.compression_level or 0
+                )
+            else:
+                compressed = zstandard.ZstdCompressor(
+                    level=self.compression_level or 3
+                ).compress(payload)
+            self.stats["compression_time"] += time.perf_counter() - start
+
+            # keep the plain pickle if compression does not pay off
+            if len(compressed) + 1 < len(payload):
+                self.stats["compressed_writes"] += 1
+                self.stats["bytes_before_compression"] += len(payload)
+                self.stats["bytes_after_compression"] += len(compressed) + 1
+                payload = COMPRESSION_HEADERS[self.compression] + compressed
+
+        self.stats["writes"] += 1
+        self.stats["bytes_written"] += len(payload)
+
+        return payload
+
+    def __loads(self, payload):
+        """
+        Deserialise payload written by __dumps, compressed or not
+        (private method)
+
+        Parameters
+        ----------
+        payload: bytes
+
+        Returns
+        -------
+        any type
+        """
+
+        self.stats["reads"] += 1
+        self.stats["bytes_read"] += len(payload)
+
+        header = payload[:1]
+        if header != b"\x80" and header in COMPRESSION_HEADERS.values():
+            start = time.perf_counter()
+            if header == COMPRESSION_HEADERS["zlib"]:
+                payload = zlib.decompress(payload[1:])
+            elif header == COMPRESSION_HEADERS["lz4"]:
+                if lz4_frame is None:
+                    raise Exception("Cache Error: lz4 package required to read value")
+                payload = lz4_frame.decompress(payload[1:])
+            else:
+                if zstandard is None:
+                    raise Exception(
+                        "Cache Error: zstandard package required to read value"
+                    )
+                payload = zstandard.ZstdDecompressor().decompress(payload[1:])
+            self.stats["decompression_time"] += time.perf_counter() - start
+            self.stats["compressed_reads"] += 1
+
+        start = time.perf_counter()
+        value = pickle.loads(payload)
+        self.stats["deserialization_time"] += time.perf_counter() - start
+
+        return value
+
+    def __bind(self, value):
+        """
+        Bind loaded graphcache objects to self cache
+        (private method)
+
+        Parameters
+        ----------
+        value: any type
+
+        Returns
+        -------
+        any type
+        """
+
+        if value.__class__.__name__ in ("GraphCache", "Node", "NodeRef"):
+            value.cache = self
+        if value.__class__.__name__ == "Node":
+            # ref groups unpickle with a cache of their own
+            value.incoming_node_refs_list.cache = self
+            value.outgoing_node_refs_list.cache = self
+
+        return value
+
     def __getstate__(self):
         """
         Required for pickling, since can't pickle redis connection
@@ -121,3 +620,4 @@ class Cache:
         self.__dict__["cache"] = redis.StrictRedis(
             host=d["host"], port=d["port"], db=d["db"]
         )
+        self.__init_session()
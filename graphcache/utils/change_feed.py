@@ -0,0 +1,234 @@
+import redis
+
+
+def get_stream_key(graphcache_ref):
+    """
+    Get key of Redis Stream with change events of a graphcache
+
+    Parameters
+    ----------
+    graphcache_ref: string
+        reference to graphcache object
+
+    Returns
+    -------
+    string
+    """
+
+    return graphcache_ref + ":changes"
+
+
+class ChangeFeed:
+    """
+    ChangeFeed class
+    Settings for appending graph mutation events to a Redis Stream (see Cache.publish)
+
+    Members
+    -------
+    stream_key: string
+        key of Redis Stream
+    maxlen: int
+        approximate maximum number of events kept in stream (optional)
+    """
+
+    def __init__(self, stream_key, maxlen=None):
+        """
+        Init method (constructor)
+
+        Parameters
+        ----------
+        stream_key: string
+            key of Redis Stream
+        maxlen: int
+            approximate maximum number of events kept in stream (optional)
+        """
+
+        self.stream_key = stream_key
+        self.maxlen = maxlen
+
+    def event(self, op, **fields):
+        """
+        Encode event as stream entry fields
+
+        Parameters
+        ----------
+        op: string
+            name of mutation, example: "add_edge"
+        fields: dict
+            event fields, None values are left out
+
+        Returns
+        -------
+        dict
+        """
+
+        event = {"op": op}
+        for key, value in fields.items():
+            if value is not None:
+                event[key] = str(value)
+
+        return event
+
+
+class ChangeFeedConsumer:
+    """
+    ChangeFeedConsumer class
+    Reads change events of a graphcache in batches, with a consumer group (checkpoint kept by
+    Redis as acknowledged events) or standalone (checkpoint kept in '<stream>:checkpoint:<name>')
+
+    example:
+    consumer = ChangeFeedConsumer(g, group="indexer", consumer="pod-1")
+    for event_id, event in consumer.read():
+        ...
+    consumer.ack()
+
+    Members
+    -------
+    stream_key: string
+        key of Redis Stream
+    group: string
+        consumer group name (optional)
+    consumer: string
+        consumer name, within group or for standalone checkpoint
+    batch_size: int
+        maximum number of events per read
+    block: int
+        milliseconds to wait for events in read, None does not wait
+    """
+
+    def __init__(
+        self, graphcache, group=None, consumer="default", batch_size=100, block=None
+    ):
+        """
+        Init method (constructor)
+
+        Parameters
+        ----------
+        graphcache: GraphCache object
+            graphcache whose change events are read
+        group: string
+            consumer group name, created at start of stream if missing (optional)
+        consumer: string
+            consumer name, within group or for standalone checkpoint
+        batch_size: int
+            maximum number of events per read
+        block: int
+            milliseconds to wait for events in read, None does not wait
+        """
+
+        self.redis = graphcache.cache.cache
+        self.stream_key = get_stream_key(graphcache.cache_key)
+        self.group = group
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.block = block
+        self._unacked = []
+
+        if group is not None:
+            try:
+                self.redis.xgroup_create(self.stream_key, group, id="0", mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+            # events delivered before a restart but never acknowledged come first
+            self._last_id = "0"
+        else:
+            self._checkpoint_key = self.stream_key + ":checkpoint:" + consumer
+            last_id = self.redis.get(self._checkpoint_key)
+            self._last_id = last_id.decode() if last_id is not None else "0"
+
+    def read(self):
+        """
+        Read next batch of events
+        Events of the previous batch are considered processed only after ack()
+
+        Returns
+        -------
+        list
+            list of (event id, event dict) tuples, oldest first
+        """
+
+        if self.group is not None:
+            response = self.redis.xreadgroup(
+                self.group,
+                self.consumer,
+                {self.stream_key: self._last_id},
+                count=self.batch_size,
+                block=self.block if self._last_id == ">" else None,
+            )
+            entries = response[0][1] if response else []
+            if self._last_id != ">" and not entries:
+                # no pending events left, read new ones
+                self._last_id = ">"
+                return self.read()
+
+        else:
+            response = self.redis.xread(
+                {self.stream_key: self._last_id},
+                count=self.batch_size,
+                block=self.block,
+            )
+            entries = response[0][1] if response else []
+
+        events = [
+            (
+                event_id.decode(),
+                dict((key.decode(), value.decode()) for key, value in fields.items()),
+            )
+            for event_id, fields in entries
+        ]
+        self._unacked.extend(event_id for event_id, _ in events)
+
+        if events and self._last_id != ">":
+            self._last_id = events[-1][0]
+
+        return events
+
+    def ack(self):
+        """
+        Acknowledge (checkpoint) all events read so far
+        """
+
+        if not self._unacked:
+            return
+
+        if self.group is not None:
+            self.redis.xack(self.stream_key, self.group, *self._unacked)
+        else:
+            self.redis.set(self._checkpoint_key, self._unacked[-1])
+
+        self._unacked = []
+
+    def consume(self, handler, max_batches=None):
+        """
+        Read batches of events, pass each batch to handler and acknowledge it after handler returns
+
+        Parameters
+        ----------
+        handler: function
+            called with list of (event id, event dict) tuples
+        max_batches: int
+            stop after these many non empty batches, None runs until a read returns
+            no events (runs forever if block is set)
+
+        Returns
+        -------
+        int
+            number of events handled
+        """
+
+        handled = 0
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            events = self.read()
+            if not events:
+                if self.block is None:
+                    break
+                continue
+            handler(events)
+            self.ack()
+            handled += len(events)
+            batches += 1
+
+        return handled
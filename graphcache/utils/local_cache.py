@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    """
+    LocalCache class
+    Client side LRU of stored payloads (bytes), bounded by total size
+
+    Members
+    -------
+    max_bytes: int
+        maximum total size of kept payloads (and their keys)
+    ttl: int
+        seconds after which a kept payload is not used, None keeps it till evicted
+    size: int
+        current total size of kept payloads (and their keys)
+    hits: int
+        number of lookups answered from local cache
+    misses: int
+        number of lookups not found (or expired) in local cache
+    evictions: int
+        number of payloads dropped to stay within max_bytes
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        """
+        Init method (constructor)
+
+        Parameters
+        ----------
+        max_bytes: int
+            maximum total size of kept payloads (and their keys)
+        ttl: int
+            seconds after which a kept payload is not used (optional)
+        """
+
+        if max_bytes <= 0:
+            raise ValueError("LocalCache Error: max_bytes must be positive")
+
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._payloads = OrderedDict()
+        # shared by request threads and background warm up
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get kept payload
+
+        Parameters
+        ----------
+        key: string
+
+        Returns
+        -------
+        bytes or None
+            None if not kept or expired
+        """
+
+        with self._lock:
+            entry = self._payloads.get(key)
+            if entry is not None and self.ttl is not None:
+                if time.monotonic() - entry[1] > self.ttl:
+                    self.__discard(key)
+                    entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._payloads.move_to_end(key)
+            self.hits += 1
+
+            return entry[0]
+
+    def set(self, key, payload):
+        """
+        Keep payload, evicting least recently used payloads if over max_bytes
+
+        Parameters
+        ----------
+        key: string
+        payload: bytes
+        """
+
+        with self._lock:
+            self.__discard(key)
+            entry_size = len(key) + len(payload)
+            if entry_size > self.max_bytes:
+                return
+
+            self._payloads[key] = (payload, time.monotonic())
+            self.size += entry_size
+            while self.size > self.max_bytes:
+                evicted_key = next(iter(self._payloads))
+                self.__discard(evicted_key)
+                self.evictions += 1
+
+    def discard(self, key):
+        """
+        Drop kept payload, if any
+
+        Parameters
+        ----------
+        key: string
+        """
+
+        with self._lock:
+            self.__discard(key)
+
+    def clear(self):
+        """
+        Drop all kept payloads
+        """
+
+        with self._lock:
+            self._payloads.clear()
+            self.size = 0
+
+    def get_stats(self):
+        """
+        Get hit/miss counters
+
+        Returns
+        -------
+        dict
+            hits, misses, hit_rate, evictions, number of payloads and their total size
+        """
+
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else None,
+            "evictions": self.evictions,
+            "payloads": len(self._payloads),
+            "bytes": self.size,
+        }
+
+    def __discard(self, key):
+        """
+        Drop kept payload, caller holds lock
+        (private method)
+
+        Parameters
+        ----------
+        key: string
+        """
+
+        entry = self._payloads.pop(key, None)
+        if entry is not None:
+            self.size -= len(key) + len(entry[0])
+
+    def __len__(self):
+        return len(self._payloads)
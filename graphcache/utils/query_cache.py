@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    QueryCache class
+    Bounded LRU of NodeRefGroup query results (lists of node references)
+
+    Members
+    -------
+    size: int
+        maximum number of results kept
+    hits: int
+        number of lookups answered from cache
+    misses: int
+        number of lookups not found in cache
+    evictions: int
+        number of results dropped to stay within size
+    """
+
+    def __init__(self, size=1024):
+        """
+        Init method (constructor)
+
+        Parameters
+        ----------
+        size: int
+            maximum number of results kept
+        """
+
+        if size <= 0:
+            raise ValueError("QueryCache Error: size must be positive")
+
+        self.size = size
+        self._results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # shared by request threads using the same graphcache
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get memoised result
+
+        Parameters
+        ----------
+        key: tuple
+            (group identity, group version, operation chain)
+
+        Returns
+        -------
+        list or None
+            list of node references, None if not memoised
+        """
+
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+
+            self._results.move_to_end(key)
+            self.hits += 1
+
+            return result
+
+    def set(self, key, result):
+        """
+        Memoise result
+
+        Parameters
+        ----------
+        key: tuple
+            (group identity, group version, operation chain)
+        result: list
+            list of node references
+        """
+
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.size:
+                self._results.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop all memoised results
+        """
+
+        with self._lock:
+            self._results.clear()
+
+    def get_stats(self):
+        """
+        Get hit/miss counters
+
+        Returns
+        -------
+        dict
+            hits, misses, hit_rate, evictions and current number of results
+        """
+
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else None,
+            "evictions": self.evictions,
+            "results": len(self._results),
+        }
+
+    def __len__(self):
+        return len(self._results)
@@ -34,6 +34,7 @@ setup(
     ],
     packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
     install_requires=["redis==3.4.1"],
+    extras_require={"lz4": ["lz4"], "zstd": ["zstandard"]},
     include_package_data=True,
     zip_safe=False,
 )